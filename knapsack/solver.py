@@ -2,10 +2,23 @@
 # -*- coding: utf-8 -*-
 
 from collections import namedtuple
+import logging
+import math
 import numpy as np
 import time
 Item = namedtuple("Item", ['index', 'value', 'weight'])
 
+logger = logging.getLogger(__name__)
+
+# the largest DP table (in bytes) to allocate - past this, the DFS is used instead
+MEMORY_BUDGET = 2 * 1024**3
+
+# rough throughput of the DP table build, in cells per second
+DP_CELLS_PER_SECOND = 10**8
+
+# the DFS stops after this many seconds, even if the tree is not exhausted
+DFS_TIME_LIMIT = 300
+
 # we want to loop through all items
 
 class dfs:
@@ -46,7 +59,11 @@ class dfs:
 
                 if self.kept_value > self.best_value:
                     self.best_value = self.kept_value
-                    self.best_set = self.current_set.copy()    
+                    # only the items kept on this branch - current_set can hold stale 1s
+                    self.best_set = self.current_set.copy()
+                    self.best_set[item+1:] = 0
+                    if self.current_level < self.next_level:
+                        self.best_set[self.current_level] = 0
 
             # when we go over from weight, update state and break
             else:
@@ -177,25 +194,19 @@ def _load_data(input_data):
 
 def _build_table(items, item_count, capacity):
     
-    dp_table = np.zeros(shape=(capacity + 1, item_count + 1))
+    # column-major so that each item's column is one contiguous block
+    dp_table = np.zeros(shape=(capacity + 1, item_count + 1), order='F')
 
     for j in range(item_count):
-        item = items[j]
-        for i in range(capacity + 1):
-            current_weight = item.weight
-            current_value = item.value
-
-            value_if_include = 0
-            prior_knapsack_at_weight = dp_table[i, j]
-
-            if current_weight <= i:
-                prior_knapsack_if_included = dp_table[max(i-current_weight, 0), j]
-                value_if_include = prior_knapsack_if_included + current_value
-
-            if value_if_include > prior_knapsack_at_weight:
-                dp_table[i, j+1] = value_if_include
-            else:
-                dp_table[i, j+1] = prior_knapsack_at_weight
+        current_weight = items[j].weight
+        current_value = items[j].value
+
+        # not taking the item keeps the prior column; taking it shifts the prior
+        # column down by the item's weight and adds the item's value
+        dp_table[:, j+1] = dp_table[:, j]
+        if current_weight <= capacity:
+            dp_table[current_weight:, j+1] = np.maximum(dp_table[current_weight:, j],
+                                                        dp_table[:capacity + 1 - current_weight, j] + current_value)
     
     return dp_table
 
@@ -223,33 +234,60 @@ def _generate_output(dp_table, items, item_count, capacity):
             current_item = prior_item
             prior_item = current_item - 1
 
-    # prepare the solution in the specified output format
-    output_data = str(value) + ' ' + str(0) + '\n'
+    # prepare the solution in the specified output format - the full table is optimal
+    output_data = str(value) + ' ' + str(1) + '\n'
     output_data += ' '.join(map(str, taken))
     
     return output_data
-def solve_it(input_data):
+def _plan(item_count, capacity):
+    '''Picks the engine up front from the size of the DP table, instead of waiting for
+       the table allocation to fail.'''
+
+    table_bytes = (capacity + 1) * (item_count + 1) * 8
+    table_seconds = (capacity + 1) * item_count / DP_CELLS_PER_SECOND
+
+    if table_bytes <= MEMORY_BUDGET:
+        return 'dp', 'the table needs %d bytes (budget %d) and ~%.3g s' % (table_bytes, MEMORY_BUDGET, table_seconds)
+
+    return 'dfs', 'the table needs %d bytes (budget %d), so DFS for up to %d s' % (table_bytes, MEMORY_BUDGET, 
+                                                                                 DFS_TIME_LIMIT)
+
+def solve_it(input_data, engine=None):
     # Modify this code to run your optimization algorithm
 
     items, item_count, capacity = _load_data(input_data)
 
-    try:
+    # passing an engine skips the planning, for testing
+    if engine is None:
+        engine, reason = _plan(item_count, capacity)
+        logger.info('running %s: %s', engine, reason)
+
+    if engine == 'dp':
         dp_table = _build_table(items, item_count, capacity)
         output_data = _generate_output(dp_table, items, item_count, capacity)
         return output_data
 
-    except:
+    elif engine == 'dfs':
         testobj = dfs(file_location=input_data)
         testobj.explore_branch()
 
+        # values are integers, so nothing beats the fractional bound of the root rounded down -
+        # a solution that meets it is optimal, and the search can stop there
+        upper_bound = math.floor(testobj.max_potential_value * (1 + 1e-12))
+
         first_time = time.time()
         second_time = time.time()
         
         # exhaust
-        while (np.sum(testobj.current_set) > 0) & (second_time - first_time < 300):
+        while ((np.sum(testobj.current_set) > 0) & (second_time - first_time < DFS_TIME_LIMIT) &
+               (testobj.best_value < upper_bound)):
             testobj.explore_branch()
             second_time = time.time()
 
+        optimal = testobj.best_value >= upper_bound
+        logger.info('dfs: best value %d, upper bound %d, gap %.3g', testobj.best_value, upper_bound,
+                    (upper_bound - testobj.best_value) / max(upper_bound, 1))
+
         # sort "back" the selected items
         index_list = []
         for i, item in enumerate(testobj.items):
@@ -260,18 +298,22 @@ def solve_it(input_data):
         final_selection = [y for (x, y) in resorted_selection]
         
         # prepare the solution in the specified output format
-        output_data = str(testobj.best_value) + ' ' + str(0) + '\n '
+        output_data = str(testobj.best_value) + ' ' + str(int(optimal)) + '\n '
         output_data += ' '.join(map(str, final_selection))
         return output_data
 
+    else:
+        raise ValueError('Unknown engine %r, expected dp or dfs' % engine)
 
 if __name__ == '__main__':
     import sys
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format='%(message)s')
     if len(sys.argv) > 1:
         file_location = sys.argv[1].strip()
         with open(file_location, 'r') as input_data_file:
             input_data = input_data_file.read()
-        print(solve_it(input_data))
+        engine = sys.argv[2].strip() if len(sys.argv) > 2 else None
+        print(solve_it(input_data, engine=engine))
     else:
         print('This test requires an input file.  Please select one from the data directory. (i.e. python solver.py ./data/ks_4_0)')
 
@@ -0,0 +1,130 @@
+'''Brad Allen. Deadlines, incumbent callbacks and cancellation, shared by the engines.'''
+
+import math
+import threading
+import time
+
+# relative slack on fractional bounds before they are rounded down - they are sums of floats
+BOUND_TOLERANCE = 1e-12
+
+class anytime:
+    '''Passed to an engine to bound how long it runs. The engine checks expired() as it goes
+       and stops early when the deadline passes or cancel() is called (from any thread). Every
+       better solution it finds goes through improve(), which calls on_incumbent(value, best_set),
+       and its final answer goes through finish(), which records whether it is proven optimal.
+
+       Engines also report upper bounds on the optimal value through bound(). Once the best
+       value reaches the upper bound it is proven optimal, and expired() tells the engine to
+       stop - there is nothing left to find.
+
+       After the engine returns, best_value, best_set, upper_bound and optimal hold the result.
+       best_set is always in the original item order. The planner records the name of the engine
+       it ran in engine.'''
+
+    def __init__(self, deadline=None, on_incumbent=None):
+        '''deadline is a time.time() timestamp, or None for no limit.'''
+
+        self.deadline = deadline
+        self.on_incumbent = on_incumbent
+        self.best_value = None
+        self.best_set = None
+        self.upper_bound = None
+        self.optimal = False
+        self.engine = None
+
+        self._cancelled = threading.Event()
+        self._parent = None
+        self._original_index = None
+        self._item_count = None
+
+    @classmethod
+    def within(cls, seconds, on_incumbent=None):
+        '''A control whose deadline is this many seconds from now.'''
+
+        return cls(deadline=time.time() + seconds, on_incumbent=on_incumbent)
+
+    def cancel(self):
+        '''Asks the engine to stop and return the best solution it has.'''
+
+        self._cancelled.set()
+
+    def expired(self):
+        '''True once the engine should stop - cancelled, past the deadline, or proven optimal.'''
+
+        return (self._cancelled.is_set() or (self.deadline is not None and time.time() >= self.deadline) or
+                self.proven())
+
+    def bound(self, value):
+        '''Records an upper bound on the optimal value, if it is tighter than the best so far.
+           Values are integers, so a fractional bound is rounded down.'''
+
+        upper_bound = math.floor(value * (1 + BOUND_TOLERANCE))
+        if self.upper_bound is not None and upper_bound >= self.upper_bound:
+            return
+
+        self.upper_bound = upper_bound
+
+        # the reduced instance has the same optimal value
+        if self._parent is not None:
+            self._parent.bound(upper_bound)
+
+    def proven(self):
+        '''True once the best value meets the upper bound.'''
+
+        return self.best_value is not None and self.upper_bound is not None and self.best_value >= self.upper_bound
+
+    def gap(self):
+        '''How far the best value may be from optimal, relative to the upper bound (None until
+           there is both a solution and a bound).'''
+
+        if self.best_value is None or self.upper_bound is None:
+            return None
+
+        return (self.upper_bound - self.best_value) / max(self.upper_bound, 1)
+
+    def improve(self, value, best_set):
+        '''Records a solution, if it is better than the best so far.'''
+
+        if self.best_value is not None and value <= self.best_value:
+            return
+
+        self.best_value = value
+        self.best_set = list(best_set)
+
+        if self._parent is not None:
+            self._parent.improve(value, self._expand(best_set))
+        if self.on_incumbent is not None:
+            self.on_incumbent(value, self.best_set)
+
+    def finish(self, value, best_set, optimal):
+        '''Records the engine's final answer.'''
+
+        self.improve(value, best_set)
+        if optimal:
+            self.bound(value)
+        self.optimal = self.proven()
+
+        if self._parent is not None:
+            self._parent.optimal = self.optimal
+
+    def for_reduced(self, original_index, item_count):
+        '''A control for a reduced instance (see reduction.reduce_input). It shares this one's
+           deadline and cancellation, and passes solutions back in the original item order.'''
+
+        child = anytime(deadline=self.deadline)
+        child._cancelled = self._cancelled
+        child._parent = self
+        child._original_index = original_index
+        child._item_count = item_count
+
+        return child
+
+    def _expand(self, best_set):
+        '''Maps a selection on the reduced instance back to the original items.'''
+
+        items_taken = [0]*self._item_count
+        for reduced_index, taken in enumerate(best_set):
+            if taken:
+                items_taken[self._original_index[reduced_index]] = 1
+
+        return items_taken
@@ -0,0 +1,176 @@
+'''Brad Allen. Solves a set of instances at once, one per worker process.
+
+    python batch.py ../data                                  every instance in the directory
+    python batch.py '../data/ks_1*' --seconds 10 --memory 512 --workers 4
+
+A JSON line is printed for each instance as it finishes - its value, whether it is proven
+optimal, the engine that ran, the seconds it took and its peak memory (bytes).'''
+
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import signal
+import sys
+import time
+from anytime import anytime
+from dynamic_prog import DEFAULT_MEMORY_BUDGET
+from instance import instance
+from planner import ENGINES, plan
+from solver import solve_it
+
+logger = logging.getLogger(__name__)
+
+# each instance's time budget (seconds) - the engines stop at it with their best so far
+BATCH_SECONDS = 60
+
+# how long past its time budget an instance may run before it is stopped - for the steps
+# that do not watch the deadline (the reduction, and some of the engines)
+GRACE_SECONDS = 10
+
+# an instance may use this many times its memory budget in all - the budget bounds the
+# engine's tables, and the instance and the engine's temporaries need room beside them
+MEMORY_LIMIT_FACTOR = 2
+
+# the pool already runs a worker per core, so the batch plans without the parallel search
+BATCH_ENGINES = [name for name in ENGINES if name != 'parallel_dfs']
+
+
+def instance_files(patterns):
+    '''The instance files named by each pattern - a directory (every file in it) or a glob.'''
+
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*')
+        files += sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+    return files
+
+
+def expected_seconds(file_location, seconds=BATCH_SECONDS, memory_budget=DEFAULT_MEMORY_BUDGET):
+    '''How long the planner expects the instance to take (see planner.plan) - at most the
+       time budget. It plans on the items that fit, in a knapsack no bigger than they are -
+       the cheap part of the reduction solve_it runs first.'''
+
+    items = instance.from_file(file_location)
+    fits = items.weight <= items.capacity
+    capacity = min(items.capacity, int(items.weight[fits].sum()))
+
+    estimates = [estimate for estimate in plan(int(fits.sum()), capacity, int(items.value[fits].sum()),
+                                               memory_budget, BATCH_ENGINES)
+                 if estimate.memory <= memory_budget]
+
+    return min(estimates[0].seconds, seconds) if estimates else seconds
+
+
+def solve_batch(files, seconds=BATCH_SECONDS, memory_budget=DEFAULT_MEMORY_BUDGET, workers=None,
+                output=sys.stdout):
+    '''Solves every instance file in a pool of worker processes, writing each result to output
+       as a JSON line as soon as it finishes. Returns the results.
+
+       The instances expected to take longest (see expected_seconds) are handed out first, so
+       the short ones fill in around them and the batch ends close to when the slowest one
+       does. Every instance runs in a fresh worker with its own time and memory budget (see
+       _solve_instance), so its peak memory is its own and a failure stays with it.'''
+
+    start_time = time.time()
+    results = []
+    with multiprocessing.Pool(workers or os.cpu_count(), initializer=_init_worker, initargs=(memory_budget,),
+                              maxtasksperchild=1) as pool:
+        expected = pool.starmap(expected_seconds, [(file_location, seconds, memory_budget) for file_location in files])
+        files = [file_location for _, file_location in sorted(zip(expected, files), key=lambda pair: -pair[0])]
+        logger.info('batch: %d instances, planned in %.3g s, longest expected first: %s', len(files),
+                    time.time() - start_time, ', '.join(os.path.basename(file_location) for file_location in files))
+
+        for result in pool.imap_unordered(_solve_instance, [(file_location, seconds, memory_budget)
+                                                           for file_location in files]):
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+            results.append(result)
+
+    logger.info('batch: %d instances in %.3g s - %d proven optimal, %d not solved', len(results),
+                time.time() - start_time, sum(1 for result in results if result['optimal']),
+                sum(1 for result in results if result['status'] != 'solved'))
+
+    return results
+
+
+def _init_worker(memory_budget):
+    '''Caps the worker's address space at its size now plus MEMORY_LIMIT_FACTOR times the
+       memory budget, so an instance that outgrows it gets a MemoryError (and the planner
+       tries its next engine) instead of taking memory from the other workers.'''
+
+    # the solvers' logs from every worker would interleave - the results say how each went
+    logging.getLogger().setLevel(logging.WARNING)
+
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            size = int(statm.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # not Linux - the planner still keeps the engine's tables within the budget
+        return
+
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+    limit = size + MEMORY_LIMIT_FACTOR * memory_budget
+    if hard_limit != resource.RLIM_INFINITY:
+        limit = min(limit, hard_limit)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard_limit))
+
+
+def _solve_instance(task):
+    '''Solves one instance file within its time budget. A solve still running GRACE_SECONDS
+       past the budget is stopped with an alarm, and the best solution reported so far is
+       kept. A failure is reported in the result instead of ending the batch.'''
+
+    file_location, seconds, memory_budget = task
+
+    control = anytime.within(seconds)
+    start_time = time.time()
+    result = {'instance': file_location}
+
+    signal.signal(signal.SIGALRM, _out_of_time)
+    signal.setitimer(signal.ITIMER_REAL, seconds + GRACE_SECONDS)
+    try:
+        output_data = solve_it(instance.from_file(file_location), control=control, memory_budget=memory_budget,
+                               engines=BATCH_ENGINES)
+        value, optimal = map(int, output_data.split()[:2])
+        result.update(status='solved', value=value, optimal=bool(optimal))
+    except TimeoutError:
+        result.update(status='timeout', value=control.best_value, optimal=False)
+    except MemoryError:
+        result.update(status='out_of_memory', value=control.best_value, optimal=False)
+    except Exception as error:
+        result.update(status='error', value=control.best_value, optimal=False, error=repr(error))
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+    # ru_maxrss is in kilobytes, but in bytes on macOS
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    result.update(engine=control.engine, seconds=round(time.time() - start_time, 3), peak_memory=peak_memory)
+
+    return result
+
+
+def _out_of_time(signum, frame):
+    raise TimeoutError('the solve ran %d s past its time budget' % GRACE_SECONDS)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solves a set of knapsack instances at once, printing a '
+                                                 'JSON line for each as it finishes.')
+    parser.add_argument('instances', nargs='+', help='directories or globs of instance files')
+    parser.add_argument('--seconds', type=float, default=BATCH_SECONDS, help='time budget per instance')
+    parser.add_argument('--memory', type=int, default=DEFAULT_MEMORY_BUDGET // 1024**2,
+                        help='memory budget per instance, in MB')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format='%(message)s')
+    files = instance_files(args.instances)
+    if not files:
+        parser.error('no instance files match %s' % ' '.join(args.instances))
+    solve_batch(files, args.seconds, args.memory * 1024**2, args.workers)
@@ -0,0 +1,323 @@
+'''Brad Allen. Timing scripts for the solver engines.
+
+Usage: python benchmark.py [instance ...]  (i.e. python benchmark.py ks_100_0 ks_500_0)
+       python benchmark.py bounds [instance ...]
+       python benchmark.py parallel [instance ...]
+       python benchmark.py warm_start [instance ...]
+       python benchmark.py discrepancy [instance ...]
+       python benchmark.py transposition [instance ...]
+       python benchmark.py parse [instance ...]'''
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from anytime import anytime
+from best_first import best_first
+from bounds import BOUNDS
+from depth_first import dfs
+from discrepancy import lds
+from dynamic_prog import dp
+from instance import instance
+from parallel import parallel_dfs
+from reduction import reduce_input
+from warm_start import WARM_START_SECONDS
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+DP_INSTANCES = ['ks_100_0', 'ks_500_0', 'ks_1000_0']
+BOUND_INSTANCES = ['ks_100_0', 'ks_100_1', 'ks_200_0', 'ks_200_1', 'ks_400_0']
+PARALLEL_INSTANCES = ['ks_300_0', 'ks_400_0', 'ks_500_0', 'ks_1000_0']
+
+# how long each search runs with each bound
+BOUND_SECONDS = 10
+
+# how long the parallel search runs with each number of workers
+PARALLEL_SECONDS = 60
+
+# how long the depth first search runs with and without the warm start
+WARM_START_SEARCH_SECONDS = 10
+
+# the instances, and the times (seconds) at which the best value so far is shown, for the
+# discrepancy search against the depth first search
+DISCREPANCY_INSTANCES = ['ks_400_0', 'ks_1000_0']
+CURVE_SECONDS = [0.01, 0.1, 1, 10, 60]
+
+# the transposition table sizes tried, and how long the depth first search runs with each
+TABLE_SIZES = [0, 10**3, 10**4, 10**5, 10**6]
+TABLE_SECONDS = 10
+
+# the instances parsed, and the items in the generated instance parsed after them
+PARSE_INSTANCES = ['ks_10000_0']
+SYNTHETIC_ITEMS = 10**7
+
+
+def _read_instance(name):
+    '''Reads an instance from the data directory.'''
+
+    with open(os.path.join(DATA_DIRECTORY, name), 'r') as input_data_file:
+        return input_data_file.read()
+
+
+def _build_table_loop(items, item_count, capacity):
+    '''The original cell-by-cell table build, kept as the reference for the benchmark.'''
+
+    dp_table = np.zeros(shape=(capacity + 1, item_count + 1))
+
+    for j in range(item_count):
+        for i in range(capacity + 1):
+            current_weight = int(items.weight[j])
+            current_value = int(items.value[j])
+
+            value_if_include = 0
+            prior_knapsack_at_weight = dp_table[i, j]
+
+            if current_weight <= i:
+                prior_knapsack_if_included = dp_table[max(i-current_weight, 0), j]
+                value_if_include = prior_knapsack_if_included + current_value
+
+            if value_if_include > prior_knapsack_at_weight:
+                dp_table[i, j+1] = value_if_include
+            else:
+                dp_table[i, j+1] = prior_knapsack_at_weight
+
+    return dp_table
+
+
+def _load_lines(input_data):
+    '''The original line by line parse, kept as the reference for the benchmark.'''
+
+    lines = input_data.split('\n')
+    item_count, capacity = map(int, lines[0].split())
+
+    values, weights = [], []
+    for line in lines[1:item_count+1]:
+        parts = line.split()
+        values.append(int(parts[0]))
+        weights.append(int(parts[1]))
+
+    return instance(values, weights, capacity)
+
+
+def _write_synthetic(input_data_file, item_count, seed=0):
+    '''Writes an instance of random items, a block of lines at a time.'''
+
+    random = np.random.default_rng(seed)
+    input_data_file.write('%d %d\n' % (item_count, 100 * item_count))
+
+    for start in range(0, item_count, 10**6):
+        block = random.integers(1, 10**6, size=(min(10**6, item_count - start), 2))
+        input_data_file.write(''.join('%d %d\n' % (value, weight) for value, weight in block.tolist()))
+
+
+def benchmark_build_table(instances=DP_INSTANCES):
+    '''Times the loop and the vectorized table build on each instance, and checks that
+       both produce the same table and the same output.'''
+
+    print('%-12s %12s %12s %10s' % ('instance', 'loop (s)', 'numpy (s)', 'speedup'))
+
+    for name in instances:
+        items = instance.load(_read_instance(name))
+        item_count, capacity = items.item_count, items.capacity
+
+        start = time.time()
+        loop_table = _build_table_loop(items, item_count, capacity)
+        loop_time = time.time() - start
+
+        start = time.time()
+        numpy_table = dp._build_table(items, item_count, capacity)
+        numpy_time = time.time() - start
+
+        assert np.array_equal(loop_table, numpy_table)
+        assert (dp._generate_output(loop_table, items, item_count, capacity) ==
+                dp._generate_output(numpy_table, items, item_count, capacity))
+        del loop_table, numpy_table
+
+        print('%-12s %12.3f %12.3f %9.0fx' % (name, loop_time, numpy_time, loop_time / numpy_time))
+
+
+def benchmark_bounds(instances=BOUND_INSTANCES, seconds=BOUND_SECONDS):
+    '''Runs the depth first and best first searches with each bound, for at most the same time,
+       on the reduced instance (as the solver does). Shows how often each bound prunes and what
+       it costs - a tighter bound pays if it prunes enough more nodes than it costs extra per
+       node, which shows in the time to finish.'''
+
+    print('%-12s %-10s %-14s %10s %10s %9s %8s %12s %8s' % ('instance', 'engine', 'bound', 'bounds', 'prune rate',
+                                                           'us/bound', 'seconds', 'best value', 'optimal'))
+
+    for name in instances:
+        reduced_items, _, _ = reduce_input(_read_instance(name))
+
+        for engine_name in ['dfs', 'best_first']:
+            for bound in BOUNDS:
+                control = anytime.within(seconds)
+                start = time.time()
+                if engine_name == 'dfs':
+                    engine = dfs(input_data=reduced_items, bound=bound)
+                    engine.depth_first_algo(control)
+                else:
+                    engine = best_first(input_data=reduced_items, bound=bound)
+                    engine.best_first_algo(control)
+                stats = engine.stats
+
+                print('%-12s %-10s %-14s %10d %10.3f %9.2f %8.2f %12d %8s' % (
+                    name, engine_name, bound, stats['bound_evaluations'], stats['prune_rate'],
+                    1e6 * stats['bound_seconds'] / max(stats['bound_evaluations'], 1), time.time() - start,
+                    control.best_value, control.optimal))
+
+
+def benchmark_parallel(instances=PARALLEL_INSTANCES, seconds=PARALLEL_SECONDS):
+    '''Runs the parallel depth first search on the reduced instance with 1, 2, 4, ... workers
+       up to one per core, for at most the same time. Shows the branches searched per second
+       and the speedup over one worker, and the best value each reaches.'''
+
+    print('%-12s %8s %12s %8s %12s %8s %12s' % ('instance', 'workers', 'branches', 'seconds', 'branches/s',
+                                                'speedup', 'best value'))
+
+    worker_counts = [2**power for power in range((os.cpu_count() or 1).bit_length())]
+
+    for name in instances:
+        reduced_items, _, _ = reduce_input(_read_instance(name))
+        single_rate = None
+
+        for workers in worker_counts:
+            control = anytime.within(seconds)
+            start = time.time()
+            engine = parallel_dfs(input_data=reduced_items, workers=workers)
+            engine.parallel_algo(control)
+            elapsed = time.time() - start
+
+            rate = engine.stats['iterations'] / elapsed
+            single_rate = single_rate or rate
+
+            print('%-12s %8d %12d %8.2f %12.0f %7.2fx %12d' % (name, workers, engine.stats['iterations'], elapsed,
+                                                               rate, rate / single_rate, control.best_value))
+
+
+def benchmark_warm_start(instances=BOUND_INSTANCES + PARALLEL_INSTANCES, seconds=WARM_START_SEARCH_SECONDS):
+    '''Runs the depth first search on the reduced instance with and without the warm start (see
+       warm_start), for at most the same time, without fixing items - so both search the same
+       tree. Shows the value after each warm start stage, how many branches each search takes,
+       and the share of the pruned nodes that the warm start value prunes on its own.'''
+
+    print('%-12s %-6s %10s %10s %10s %10s %8s %8s %12s' % ('instance', 'warm', 'greedy', '+ single', '+ swaps',
+                                                          'branches', 'seconds', 'pruned', 'best value'))
+
+    for name in instances:
+        reduced_items, _, _ = reduce_input(_read_instance(name))
+
+        for warm_start_seconds in [None, WARM_START_SECONDS]:
+            control = anytime.within(seconds)
+            start = time.time()
+            engine = dfs(input_data=reduced_items, fix=False, warm_start_seconds=warm_start_seconds)
+            engine.depth_first_algo(control)
+            stats = engine.stats
+
+            print('%-12s %-6s %10s %10s %10s %10d %8.2f %7.0f%% %12d' % (
+                name, warm_start_seconds is not None, stats.get('greedy_value', '-'),
+                stats.get('single_item_value', '-'), stats.get('local_search_value', '-'), engine.iterations,
+                time.time() - start, 100 * stats['warm_start_prune_share'], control.best_value))
+
+
+def benchmark_discrepancy(instances=DISCREPANCY_INSTANCES, marks=CURVE_SECONDS):
+    '''Runs the depth first search and the limited discrepancy search on the reduced instance
+       for the same time, and shows the best value each has after each mark - the quality of
+       the solution over time. The time includes building the engine, so the depth first
+       search pays for its warm start.'''
+
+    print('%-12s %-12s' % ('instance', 'engine') + ''.join('%12s' % ('%gs' % mark) for mark in marks) +
+          '%10s' % 'optimal')
+
+    for name in instances:
+        reduced_items, _, _ = reduce_input(_read_instance(name))
+
+        for engine_name in ['dfs', 'lds']:
+            start = time.time()
+            curve = []
+            control = anytime(deadline=start + marks[-1],
+                              on_incumbent=lambda value, best_set: curve.append((time.time() - start, value)))
+            if engine_name == 'dfs':
+                dfs(input_data=reduced_items).depth_first_algo(control)
+            else:
+                lds(input_data=reduced_items).discrepancy_algo(control)
+
+            values = [max([value for seconds, value in curve if seconds <= mark], default=0) for mark in marks]
+            print('%-12s %-12s' % (name, engine_name) + ''.join('%12d' % value for value in values) +
+                  '%10s' % control.optimal)
+
+
+def benchmark_transposition(instances=BOUND_INSTANCES + PARALLEL_INSTANCES, sizes=TABLE_SIZES,
+                            seconds=TABLE_SECONDS):
+    '''Runs the depth first search on the reduced instance with each transposition table size,
+       for at most the same time. Shows the branches, the table hits, stores and evictions, and
+       the time to finish - the smallest size with few evictions is enough for the instance.'''
+
+    print('%-12s %10s %10s %10s %10s %10s %8s %12s' % ('instance', 'table', 'branches', 'hits', 'stores',
+                                                       'evictions', 'seconds', 'best value'))
+
+    for name in instances:
+        reduced_items, _, _ = reduce_input(_read_instance(name))
+
+        for table_size in sizes:
+            control = anytime.within(seconds)
+            start = time.time()
+            engine = dfs(input_data=reduced_items, table_size=table_size)
+            engine.depth_first_algo(control)
+            stats = engine.stats
+
+            print('%-12s %10d %10d %10d %10d %10d %8.2f %12d' % (
+                name, table_size, engine.iterations, stats['table_hits'], stats['table_stores'],
+                stats['table_evictions'], time.time() - start, control.best_value))
+
+
+def benchmark_parse(instances=PARSE_INSTANCES, synthetic_items=SYNTHETIC_ITEMS):
+    '''Times the line by line parse, instance.load on the file's contents (reading it
+       included) and instance.from_file on each instance, and on a generated instance of
+       synthetic_items items. Checks that all three give the same items.'''
+
+    print('%-22s %12s %12s %12s %10s' % ('instance', 'lines (s)', 'load (s)', 'mmap (s)', 'speedup'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        synthetic = os.path.join(directory, 'ks_%d_synthetic' % synthetic_items)
+        with open(synthetic, 'w') as input_data_file:
+            _write_synthetic(input_data_file, synthetic_items)
+
+        for name, file_location in ([(name, os.path.join(DATA_DIRECTORY, name)) for name in instances] +
+                                    [(os.path.basename(synthetic), synthetic)]):
+            start = time.time()
+            with open(file_location, 'r') as input_data_file:
+                line_items = _load_lines(input_data_file.read())
+            line_time = time.time() - start
+
+            start = time.time()
+            with open(file_location, 'r') as input_data_file:
+                loaded_items = instance.load(input_data_file.read())
+            load_time = time.time() - start
+
+            start = time.time()
+            mapped_items = instance.from_file(file_location)
+            mapped_time = time.time() - start
+
+            for items in [loaded_items, mapped_items]:
+                assert np.array_equal(items.value, line_items.value) and np.array_equal(items.weight, line_items.weight)
+            del line_items, loaded_items, mapped_items
+
+            print('%-22s %12.3f %12.3f %12.3f %9.1fx' % (name, line_time, load_time, mapped_time,
+                                                        line_time / mapped_time))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['bounds']:
+        benchmark_bounds(sys.argv[2:] or BOUND_INSTANCES)
+    elif sys.argv[1:2] == ['parallel']:
+        benchmark_parallel(sys.argv[2:] or PARALLEL_INSTANCES)
+    elif sys.argv[1:2] == ['warm_start']:
+        benchmark_warm_start(sys.argv[2:] or BOUND_INSTANCES + PARALLEL_INSTANCES)
+    elif sys.argv[1:2] == ['discrepancy']:
+        benchmark_discrepancy(sys.argv[2:] or DISCREPANCY_INSTANCES)
+    elif sys.argv[1:2] == ['transposition']:
+        benchmark_transposition(sys.argv[2:] or BOUND_INSTANCES + PARALLEL_INSTANCES)
+    elif sys.argv[1:2] == ['parse']:
+        benchmark_parse(sys.argv[2:] or PARSE_INSTANCES)
+    else:
+        benchmark_build_table(sys.argv[1:] or DP_INSTANCES)
@@ -0,0 +1,165 @@
+'''Brad Allen. Scratch work.'''
+
+import heapq
+import time
+from collections import namedtuple
+from anytime import anytime
+from bounds import BOUNDS, DEFAULT_BOUND
+from dynamic_prog import dp
+from instance import instance
+
+# open nodes held in the heap - past this, popped nodes are searched depth first instead
+DEFAULT_MAX_NODES = 10**6
+
+# rough size of an open node (the node, its heap entry and its bound), in bytes
+NODE_BYTES = 200
+
+# a node is the next item to decide on, the weight left and the value kept so far. The items
+# taken are a linked list back to the root, so a node shares its prefix with its ancestors
+# instead of holding a copy of the whole selection
+Node = namedtuple("Node", ['level', 'floor', 'kept_value', 'taken'])
+Taken = namedtuple("Taken", ['item', 'parent'])
+
+class best_first:
+    '''This class employs a best first branch and bound strategy. Unlike dfs, the open nodes
+       are kept in a heap ordered by their upper bound (see bounds - the fractional bound unless
+       another is picked), and the most promising one is always expanded next.
+
+       Expanding a node follows its LP solution - each item that fits is taken, and the node
+       without it is left open. Once the node's bound falls below the best open node, it goes
+       back in the heap. The best open node bounds every solution not yet found, so the search
+       is proven optimal once it cannot beat the best solution seen.
+
+       When the heap holds max_nodes open nodes, the nodes popped from it are searched depth
+       first (with a stack, which holds at most one node per item) until the heap shrinks.'''
+
+    def __init__(self, input_data, max_nodes=DEFAULT_MAX_NODES, bound=DEFAULT_BOUND):
+        if bound not in BOUNDS:
+            raise ValueError('Unknown bound %r, expected one of: %s' % (bound, ', '.join(BOUNDS)))
+
+        self.input_data = input_data
+        self.max_nodes = max_nodes
+        self.items = instance.load(input_data).by_density()
+        self.item_count, self.capacity = self.items.item_count, self.items.capacity
+        self.bound = BOUNDS[bound]
+        self.stats = {'bound': bound, 'bound_evaluations': 0, 'bound_seconds': 0.0}
+
+        # python lists index faster than arrays, one item at a time
+        self.weights, self.values = self.items.weight.tolist(), self.items.value.tolist()
+
+        self.best_value = 0
+        self.best_taken = None
+        self.pushed = 0
+
+    def best_first_algo(self, control=None):
+        '''Expands the best open node until none can beat the best solution, or the control
+           (see anytime) expires. Every better solution is reported to the control as it is
+           found, and the bound of the best open node is its upper bound.'''
+
+        control = control or anytime()
+        self.stats.update(expanded=0, max_open=0, dives=0, pruned=0)
+
+        heap = []
+        self._push_open(heap, Node(0, self.capacity, 0, None))
+
+        while heap and not control.expired():
+            negative_bound, _, node = heapq.heappop(heap)
+            control.bound(max(self.best_value, -negative_bound))
+
+            if len(heap) < self.max_nodes:
+                self._expand(node, heap, control, dive=False)
+                continue
+
+            # the heap is full - search this node's subtree depth first
+            self.stats['dives'] += 1
+            stack = [node]
+            while stack and not control.expired():
+                self._expand(stack.pop(), stack, control, dive=True)
+
+        # an empty heap means every node was pruned - unless the last dive was stopped
+        exhausted = not heap and not control.expired()
+        self.stats['pushed'] = self.pushed
+        self.stats['prune_rate'] = self.stats['pruned'] / max(self.stats['bound_evaluations'], 1)
+        control.finish(self.best_value, self._selection(self.best_taken), exhausted)
+        self.stats['optimal'] = control.optimal
+
+        return self._generate_output(control)
+
+    def _expand(self, node, open_nodes, control, dive):
+        '''Follows the node's LP solution, leaving the node without each item it takes in
+           open_nodes - the heap, or the stack when diving.'''
+
+        self.stats['expanded'] += 1
+        level, floor, kept_value, taken = node
+
+        while level < self.item_count:
+            bound = kept_value + self._upper_bound(level, floor)
+            if bound * (1 + 1e-12) < self.best_value + 1:
+                self.stats['pruned'] += 1
+                return
+
+            # the item does not fit - skip it, and stop here if a better node is open
+            if self.weights[level] > floor:
+                level += 1
+                if dive or not open_nodes:
+                    continue
+
+                if kept_value + self._upper_bound(level, floor) < -open_nodes[0][0]:
+                    self._push_open(open_nodes, Node(level, floor, kept_value, taken))
+                    return
+                continue
+
+            # take the item, and leave the node without it open
+            skipped = Node(level + 1, floor, kept_value, taken)
+            if dive:
+                open_nodes.append(skipped)
+            else:
+                self._push_open(open_nodes, skipped)
+
+            floor -= self.weights[level]
+            kept_value += self.values[level]
+            taken = Taken(level, taken)
+            level += 1
+
+            if kept_value > self.best_value:
+                self.best_value = kept_value
+                self.best_taken = taken
+                control.improve(kept_value, self._selection(taken))
+
+    def _push_open(self, heap, node):
+        '''Adds a node to the heap, unless its bound cannot beat the best solution. Ties go
+           to the newest node, which is the deepest.'''
+
+        bound = node.kept_value + self._upper_bound(node.level, node.floor)
+        if bound * (1 + 1e-12) < self.best_value + 1:
+            self.stats['pruned'] += 1
+            return
+
+        self.pushed += 1
+        heapq.heappush(heap, (-bound, -self.pushed, node))
+        self.stats['max_open'] = max(self.stats['max_open'], len(heap))
+
+    def _upper_bound(self, next_item, floor):
+        '''The most value the items from next_item on can add, with the chosen bound.'''
+
+        start_time = time.perf_counter()
+        estimated_value = self.bound(self.items, next_item, floor)
+        self.stats['bound_seconds'] += time.perf_counter() - start_time
+        self.stats['bound_evaluations'] += 1
+
+        return estimated_value
+
+    def _selection(self, taken):
+        '''Follows the linked list of taken items back to the root, in the original order.'''
+
+        items_taken = [0]*self.item_count
+        while taken is not None:
+            items_taken[taken.item] = 1
+            taken = taken.parent
+
+        return self.items.original_order(items_taken)
+
+    def _generate_output(self, control):
+        '''The best solution the control has seen, in the specified output format.'''
+
+        return dp._format_output(control.best_value, control.best_set, control.optimal)
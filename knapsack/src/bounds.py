@@ -0,0 +1,98 @@
+'''Brad Allen. Upper bounds for the branch and bound searches.
+
+Every bound takes the items in density order (see instance.by_density), the next item to decide
+on and the weight left (the floor), and returns an upper bound on the value the items from
+next_item on can add. The searches add the value already kept.'''
+
+import math
+import numpy as np
+from anytime import BOUND_TOLERANCE
+
+DEFAULT_BOUND = 'dantzig'
+
+
+def dantzig_bound(items, next_item, floor):
+    '''The fractional (LP) bound - the items in density order until one does not fit (the break
+       item), and then the fraction of it that does.'''
+
+    break_item, value, residual = _break_item(items, next_item, floor)
+    if break_item == items.item_count:
+        return value
+
+    return value + residual * items.density[break_item]
+
+
+def martello_toth_bound(items, next_item, floor):
+    '''Martello and Toth's U2. In an integer solution the break item is either left out - then
+       the weight left is filled at best at the density of the item after it - or put in - then
+       its missing weight comes out at best at the density of the item before it. The bound is
+       the better of the two, rounded down. Never weaker than dantzig_bound.'''
+
+    break_item, value, residual = _break_item(items, next_item, floor)
+    if break_item == items.item_count:
+        return value
+
+    # the break item left out
+    without_break = value
+    if break_item + 1 < items.item_count:
+        without_break += _round_down(residual * items.density[break_item + 1])
+
+    # the break item put in - impossible if no item before it can make room
+    with_break = -math.inf
+    if break_item > next_item:
+        with_break = value + _round_down(items.value[break_item] -
+                                         (items.weight[break_item] - residual) * items.density[break_item - 1])
+
+    return max(without_break, with_break)
+
+
+def enumerative_bound(items, next_item, floor):
+    '''Branches on the break item, and takes the better fractional bound of the two branches -
+       the break item left out (the items after it fill the weight left), or put in (the
+       items before it give up its weight) - rounded down. Never weaker than martello_toth_bound.'''
+
+    break_item, value, residual = _break_item(items, next_item, floor)
+    if break_item == items.item_count:
+        return value
+
+    # the break item left out
+    without_break = value + _fill(items, break_item + 1, residual)
+
+    # the break item put in, with the fractional bound of the items before it
+    with_break = -math.inf
+    if items.weight[break_item] <= floor:
+        with_break = items.value[break_item] + _fill(items, next_item, floor - items.weight[break_item])
+
+    return _round_down(max(without_break, with_break))
+
+
+BOUNDS = {'dantzig': dantzig_bound,
+          'martello_toth': martello_toth_bound,
+          'enumerative': enumerative_bound}
+
+
+def _break_item(items, next_item, floor):
+    '''The first item from next_item on that does not fit after the ones before it, the value
+       of the ones before it, and the weight they leave.'''
+
+    target = items.cum_weight[next_item] + floor
+    break_item = int(np.searchsorted(items.cum_weight, target, side='right')) - 1
+
+    return (break_item, int(items.cum_value[break_item] - items.cum_value[next_item]),
+            int(target - items.cum_weight[break_item]))
+
+
+def _round_down(value):
+    '''Values are integers, so a fractional bound rounds down - with some slack, since it is a
+       sum of floats.'''
+
+    return math.floor(value + abs(value) * BOUND_TOLERANCE)
+
+
+def _fill(items, next_item, floor):
+    '''The fractional bound of the items from next_item on, for the weight left.'''
+
+    if next_item >= items.item_count:
+        return 0
+
+    return dantzig_bound(items, next_item, floor)
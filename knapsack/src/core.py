@@ -0,0 +1,130 @@
+'''Brad Allen. Scratch work.'''
+
+import numpy as np
+from anytime import anytime
+from dynamic_prog import dp, DEFAULT_MEMORY_BUDGET
+from instance import instance
+
+# items either side of the break item in the first core
+DEFAULT_CORE_SIZE = 25
+
+class core:
+    '''This class solves the "core problem" (in the style of Pisinger's expanding core). In
+       density order, the optimal solution almost always matches the greedy one except near
+       the break item - the first item greedy cannot fit. So the items before the core are
+       fixed in, the items after it are fixed out, and only the core is solved exactly.
+
+       A fixed item is proven when the best fractional value with that item flipped cannot
+       beat the core solution (see _flipped_bounds). Until every fixed item is proven, the
+       unproven ones are added to the core and it is solved again.'''
+
+    def __init__(self, input_data, core_size=DEFAULT_CORE_SIZE, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.input_data = input_data
+        self.core_size = core_size
+        self.memory_budget = memory_budget
+        self.items = instance.load(input_data).by_density()
+        self.item_count, self.capacity = self.items.item_count, self.items.capacity
+        self.stats = {}
+
+    def expanding_core_algo(self, control=None):
+        '''Solves the core around the break item, expanding it until the fixed items are
+           proven. Guaranteed optimal, unless the control (see anytime) expires - then the
+           best solution of the rounds so far is returned.'''
+
+        control = control or anytime()
+
+        weights, values = self.items.weight, self.items.value
+        cum_weight, cum_value = self.items.cum_weight, self.items.cum_value
+
+        # the break item, and the fractional (LP) bound it gives
+        break_item = int(np.searchsorted(cum_weight, self.capacity, side='right')) - 1
+        if break_item == self.item_count:
+            control.finish(int(cum_value[-1]), self._original_order(np.ones(self.item_count, dtype=int)), True)
+            return self._generate_output(control)
+
+        # the greedy solution is the first incumbent, and the fractional bound the first upper bound
+        control.improve(int(cum_value[break_item]), self._original_order(np.arange(self.item_count) < break_item))
+        control.bound(cum_value[break_item] + 
+                      (self.capacity - cum_weight[break_item]) * self.items.density[break_item])
+
+        flipped_bound = self._flipped_bounds(weights, values, cum_weight, cum_value, break_item)
+
+        # the first core is a window around the break item
+        in_core = np.zeros(self.item_count, dtype=bool)
+        in_core[max(break_item - self.core_size, 0):break_item + self.core_size + 1] = True
+        fixed_in = np.arange(self.item_count) < break_item
+        self.stats['rounds'] = 0
+
+        while True:
+            self.stats['rounds'] += 1
+
+            # items outside the core keep their greedy value
+            core_index = np.flatnonzero(in_core)
+            core_taken = [0]*len(core_index)
+            dp._divide_and_conquer(self.items[core_index],
+                                   self.capacity - int(weights[fixed_in & ~in_core].sum()),
+                                   core_taken, 0, self.memory_budget, control)
+
+            items_taken = (fixed_in & ~in_core).astype(int)
+            items_taken[core_index] = core_taken
+            best_value = int(values @ items_taken)
+            control.improve(best_value, self._original_order(items_taken))
+
+            if control.expired():
+                proven = control.proven()
+                break
+
+            # the core is solved, so a better solution has to flip some fixed item - and is worth
+            # at most that item's flipped bound
+            control.bound(max(best_value, flipped_bound[~in_core].max(initial=-np.inf)))
+
+            # the fixed items whose flipped bound could still beat the core solution join it
+            unproven = (flipped_bound * (1 + 1e-12) >= best_value + 1) & ~in_core
+            if not unproven.any():
+                proven = True
+                break
+
+            in_core |= unproven
+
+        self.stats['core_items'] = int(in_core.sum())
+        self.stats['fixed_items'] = self.item_count - self.stats['core_items']
+        control.finish(best_value, self._original_order(items_taken), proven)
+        self.stats['optimal'] = control.optimal
+
+        return self._generate_output(control)
+
+    def _flipped_bounds(self, weights, values, cum_weight, cum_value, break_item):
+        '''For every item, the best fractional value with the item flipped away from its
+           greedy value - forced out for the items before the break item, forced in for the
+           rest. The prefix sums find the new break item for every item at once.'''
+
+        densities = self.items.density
+        flipped_bound = np.empty(self.item_count)
+
+        # forced out - the items after it move up to fill its weight
+        before = np.arange(break_item)
+        target = self.capacity + weights[before]
+        new_break = np.searchsorted(cum_weight, target, side='right') - 1
+        flipped_bound[before] = cum_value[new_break] - values[before]
+        partial = new_break < self.item_count
+        flipped_bound[before[partial]] += (target - cum_weight[new_break])[partial] * densities[new_break[partial]]
+
+        # forced in - the greedy fill stops earlier, and it does not fit at all if too heavy
+        after = np.arange(break_item, self.item_count)
+        target = self.capacity - weights[after]
+        new_break = np.searchsorted(cum_weight, np.maximum(target, 0), side='right') - 1
+        flipped_bound[after] = (values[after] + cum_value[new_break] + 
+                                (target - cum_weight[new_break]) * densities[new_break])
+        flipped_bound[after[target < 0]] = -np.inf
+
+        return flipped_bound
+
+    def _original_order(self, items_taken):
+        '''Sorts a selection back into the original item order.'''
+
+        return self.items.original_order(items_taken)
+
+    def _generate_output(self, control):
+        '''The best solution the control has seen, in the specified output format.'''
+
+        return dp._format_output(control.best_value, control.best_set, control.optimal)
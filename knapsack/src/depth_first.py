@@ -2,8 +2,25 @@
 
 import pandas as pd
 import os
-from collections import namedtuple
+import tempfile
+from collections import OrderedDict
 import numpy as np
+import time
+from anytime import anytime
+from bounds import BOUNDS, DEFAULT_BOUND
+from instance import instance
+from reduction import fix_items
+from warm_start import warm_start, WARM_START_SECONDS
+
+# the search stops after this many seconds (when not given a deadline), even if the tree
+# is not exhausted
+DFS_TIME_LIMIT = 300
+
+# how often (seconds) the search state is written to the checkpoint file, when it has one
+CHECKPOINT_SECONDS = 60
+
+# the most (level, floor) states the transposition table keeps - roughly 200 bytes each
+TABLE_SIZE = 200000
 
 class dfs:
     '''This class employs a depth first search strategy - the main function is explore_branch(),
@@ -14,33 +31,222 @@ class dfs:
            
         The state of the next branch for exploring is calculated using the next_branch() function,
         which updates the next node for searching, as well as the starting floor and max potential
-        value.'''
+        value. depth_first_algo() runs the whole search.
+
+        Neither rescans the items. The density sorted weights and values are kept as prefix sums,
+        so a branch (the items that fit one after another) and the upper bound (see bounds) are
+        each found with a searchsorted. The floor and kept value are updated by the items that
+        join or leave the path.
+
+        The bound is picked by name from bounds.BOUNDS. How often it prunes, and the time spent
+        on it, are recorded in self.stats.
+
+        The search starts from the warm start solution (see warm_start) rather than from nothing,
+        so it prunes from the first branch - the nodes it would prune on its own are counted in
+        self.stats. Items are then fixed in or out against it (see reduction.fix_items) - the
+        search only runs on the free items, and the fixed items are merged back into the output.
+
+        The search state can be written to a checkpoint file (save_checkpoint) and picked up by
+        a new process (resume) - the search then continues exactly where it stopped.
+
+        Many different sets of items reach the same level with the same weight left. A
+        transposition table keeps the most value kept at each (level, floor) the search has
+        started a branch from, and a node that kept no more is pruned - its subtree was already
+        searched with a better start. The table holds at most table_size states (0 turns it
+        off), evicting the least recently used. Its hits and evictions are in self.stats.'''
     
-    def __init__(self, input_data):
+    def __init__(self, input_data, bound=DEFAULT_BOUND, fix=True, warm_start_seconds=WARM_START_SECONDS,
+                 table_size=TABLE_SIZE):
         '''As the algo traverses different branches, many variables are required to keep state - 
            for global values as well as updating nodes to explore.'''
         
+        if bound not in BOUNDS:
+            raise ValueError('Unknown bound %r, expected one of: %s' % (bound, ', '.join(BOUNDS)))
+
         # global variables
         self.input_data = input_data
         self.iterations = 0
-        self.items, self.item_count, self.capacity = self._load_data()
-        self.best_value = 0
-        self.best_set = np.zeros(len(self.items)).astype(int)
+        self.items = instance.load(input_data).by_density()
+        self.original_item_count = self.items.item_count
+        self.fingerprint = self.items.fingerprint()
+        self.exhausted = False
+        self.bound = BOUNDS[bound]
+        self.stats = {'bound': bound, 'bound_evaluations': 0, 'bound_seconds': 0.0, 'pruned': 0}
+
+        # (level, floor) -> the most value kept there, least recently used first
+        self.table = OrderedDict()
+        self.table_size = table_size
+        self.stats.update(table_hits=0, table_stores=0, table_evictions=0)
+
+        # the starting solution - with no time for the warm start, the search starts from nothing
+        incumbent_value, incumbent_set = 0, np.zeros(self.original_item_count).astype(int)
+        if warm_start_seconds is not None:
+            incumbent_value, incumbent_set, warm_start_stats = warm_start(self.items, warm_start_seconds)
+            self.stats.update(warm_start_stats)
+
+        # the items fixed in - their value is added to best_value in the output
+        self.fixed_index = np.zeros(0, dtype=np.int64)
+        self.fixed_value = 0
+        if fix:
+            incumbent_set = self._fix_items(incumbent_value, incumbent_set)
+
+        # the starting solution, less the items fixed in, is the best on the free items so far
+        self.best_value = self.warm_start_value = incumbent_value - self.fixed_value
+        self.best_set = incumbent_set
+        self.stats['warm_start_pruned'] = 0
+
+        self._prepare_search()
+
+    def _prepare_search(self):
+        '''The prefix sums of the items searched, and the state of the root node.'''
+
+        self.item_count, self.capacity = self.items.item_count, self.items.capacity
+
+        # prefix sums in density order
+        self.cum_weight, self.cum_value = self.items.cum_weight, self.items.cum_value
+
+        # items heavier than the knapsack are never kept, even if current_set marks them
+        fits = self.items.weight <= self.capacity
+        self.weights, self.values = self.items.weight * fits, self.items.value * fits
+        self.cum_kept_weight = np.concatenate(([0], np.cumsum(self.weights)))
+        self.cum_kept_value = np.concatenate(([0], np.cumsum(self.values)))
         
         # node-specific variables - "kept_value" is value accrued, "floor" is weight left
         self.kept_value = 0
         self.floor = self.capacity
         
-        self.current_set = np.zeros(len(self.items)).astype(int)
+        self.current_set = np.zeros(self.item_count).astype(int)
         self.current_level = 0
-        self.max_potential_value = self._value_estimate(items=self.items, 
-                                                        capacity=self.capacity, 
-                                                        level=self.current_level, 
-                                                        function_set=np.ones(len(self.items)).astype(int), 
-                                                        iterations=self.iterations)
+        self.max_potential_value = self._upper_bound(next_item=0, floor=self.capacity)
         self.current_max_value = self.max_potential_value
         self.next_level = self.current_level
     
+    def _fix_items(self, incumbent_value, incumbent_set):
+        '''Fixes items in or out against the starting solution (see reduction.fix_items), and
+           keeps only the free items - in a knapsack less the weight of the ones fixed in.
+           Returns the starting solution's selection of the free items.'''
+
+        fixed_in, fixed_out = fix_items(self.items, incumbent_value)
+        free = ~(fixed_in | fixed_out)
+
+        self.fixed_index = self.items.index[fixed_in]
+        self.fixed_value = int(self.items.value[fixed_in].sum())
+        self.items = instance(self.items.value[free], self.items.weight[free],
+                              self.items.capacity - int(self.items.weight[fixed_in].sum()), self.items.index[free])
+        self.stats.update(fixed_in=int(fixed_in.sum()), fixed_out=int(fixed_out.sum()),
+                          free_items=self.items.item_count)
+
+        return incumbent_set[free]
+
+    @classmethod
+    def resume(cls, input_data, checkpoint, bound=DEFAULT_BOUND):
+        '''The search saved in the checkpoint file (see save_checkpoint), on the same instance -
+           depth_first_algo() carries on from where it stopped. A checkpoint of another instance
+           raises a ValueError.'''
+
+        engine = cls(input_data, bound=bound, fix=False, warm_start_seconds=None)
+
+        with np.load(checkpoint) as state:
+            if str(state['fingerprint']) != engine.fingerprint:
+                raise ValueError('The checkpoint %r is not of this instance.' % checkpoint)
+
+            # the free items, in the order they were searched, and the ones fixed in
+            items = instance.load(input_data)
+            item_index = state['item_index']
+            engine.items = instance(items.value[item_index], items.weight[item_index], int(state['capacity']),
+                                    item_index)
+            engine.fixed_index = state['fixed_index']
+            engine.fixed_value = int(state['fixed_value'])
+            engine._prepare_search()
+
+            for name in ['current_set', 'best_set']:
+                setattr(engine, name, state[name].astype(int))
+            for name in ['current_level', 'next_level', 'floor', 'kept_value', 'best_value', 'warm_start_value',
+                         'iterations']:
+                setattr(engine, name, int(state[name]))
+            engine.current_max_value = float(state['current_max_value'])
+            engine.max_potential_value = float(state['max_potential_value'])
+            engine.exhausted = bool(state['exhausted'])
+
+            for name in ['bound_evaluations', 'pruned', 'warm_start_pruned']:
+                engine.stats[name] = int(state[name])
+        engine.stats['resumed_iterations'] = engine.iterations
+
+        return engine
+
+    def save_checkpoint(self, checkpoint):
+        '''Writes the search state to the checkpoint file. It is written to a temporary file
+           next to it first and then renamed, so the checkpoint is never left half written.'''
+
+        directory = os.path.dirname(os.path.abspath(checkpoint))
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as checkpoint_file:
+            np.savez(checkpoint_file, fingerprint=self.fingerprint, item_index=self.items.index,
+                     capacity=self.capacity, fixed_index=self.fixed_index, fixed_value=self.fixed_value,
+                     current_set=self.current_set, current_level=self.current_level, next_level=self.next_level,
+                     floor=self.floor, kept_value=self.kept_value, current_max_value=self.current_max_value,
+                     max_potential_value=self.max_potential_value, best_set=self.best_set,
+                     best_value=self.best_value, warm_start_value=self.warm_start_value,
+                     iterations=self.iterations, exhausted=self.exhausted,
+                     bound_evaluations=self.stats['bound_evaluations'], pruned=self.stats['pruned'],
+                     warm_start_pruned=self.stats['warm_start_pruned'])
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+        os.replace(checkpoint_file.name, checkpoint)
+
+    def depth_first_algo(self, control=None, time_limit=DFS_TIME_LIMIT, checkpoint=None,
+                         checkpoint_seconds=CHECKPOINT_SECONDS):
+        '''Explores branches until the tree is exhausted or the control (see anytime) expires.
+           Without a deadline on the control, the search stops after time_limit seconds. Every
+           better solution is reported to the control as it is found, and the bound of the root
+           is its upper bound - so the search stops as soon as a solution meets it.
+
+           With a checkpoint file, the state is saved to it every checkpoint_seconds and when
+           the search stops.'''
+
+        control = control or anytime()
+        control.bound(self.fixed_value + self.max_potential_value)
+        start_time = last_checkpoint = time.time()
+        reported_value = None
+
+        # every item may be fixed, leaving nothing to search - and a resumed search may be done
+        if self.item_count and not self.exhausted:
+            self.explore_branch()
+
+        # exhaust
+        while True:
+            if self.best_value != reported_value:
+                reported_value = self.best_value
+                control.improve(self.fixed_value + self.best_value, self._original_order(self.best_set))
+
+            if np.sum(self.current_set) == 0:
+                self.exhausted = True
+                break
+            if control.expired():
+                break
+            if control.deadline is None and time.time() - start_time >= time_limit:
+                break
+
+            if checkpoint is not None and time.time() - last_checkpoint >= checkpoint_seconds:
+                self.save_checkpoint(checkpoint)
+                last_checkpoint = time.time()
+
+            self.explore_branch()
+
+        if checkpoint is not None:
+            self.save_checkpoint(checkpoint)
+
+        control.finish(self.fixed_value + self.best_value, self._original_order(self.best_set), False)
+        self.stats['iterations'] = self.iterations
+        self.stats['prune_rate'] = self.stats['pruned'] / max(self.stats['bound_evaluations'], 1)
+        self.stats['warm_start_prune_share'] = self.stats['warm_start_pruned'] / max(self.stats['pruned'], 1)
+        self.stats['table_entries'] = len(self.table)
+        self.stats['table_hit_rate'] = self.stats['table_hits'] / max(self.stats['table_hits'] +
+                                                                      self.stats['table_stores'], 1)
+        self.stats['optimal'] = control.optimal
+
+        return self._generate_output(control.optimal)
+
     def explore_branch(self):
         '''Traverses an individual branch until it:
            (1) uses up too much weight (the "floor" is negative), 
@@ -50,30 +256,81 @@ class dfs:
            Then updates state for next exploration. This function is used in a while loop.
            '''
         
-        for item in range(self.next_level, len(self.items), 1):
-            # if we already have a best value that is higher than what is possible, break
-            if self.current_max_value < self.best_value:
-                break
+        start = self.next_level
+
+        # if we already have a best value that is higher than what is possible, break
+        if self.current_max_value < self.best_value:
+            item = start
+            if self.floor >= 0:
+                self.stats['pruned'] += 1
+
+                # the warm start prunes this node on its own
+                if self.current_max_value < self.warm_start_value:
+                    self.stats['warm_start_pruned'] += 1
+
+        # the same level and floor, reached before with at least as much value kept
+        elif self._transposed(start):
+            item = start
+
+        # include items until the next one leads us to go "over" in weight - the prefix sums
+        # find it directly. If we are at the end of a branch, update
+        else:
+            end = int(np.searchsorted(self.cum_weight, self.cum_weight[start] + self.floor, side='right')) - 1
+            end = max(end, start)
 
-            # if the next item leads us to go "over" in weight, break otherwise, include 
-            # and update state. If we are at the end of a branch, update
-            if self.items[item].weight <= self.floor:
-                self.kept_value += self.items[item].value
-                self.floor -= self.items[item].weight
-                self.current_set[item] = 1  
+            if end > start:
+                self.kept_value += int(self.cum_value[end] - self.cum_value[start])
+                self.floor -= int(self.cum_weight[end] - self.cum_weight[start])
+                self.current_set[start:end] = 1
 
                 if self.kept_value > self.best_value:
                     self.best_value = self.kept_value
-                    self.best_set = self.current_set.copy()    
+                    self.best_set = self._branch_selection(end - 1)
+
+            # the item that did not fit, or the last item
+            item = min(end, self.item_count - 1)
 
-            # when we go over from weight, update state and break
-            else:
-                break
-                
         self.iterations += 1
         
         return self.best_value, self.best_set, self.iterations, self.next_branch(item)
     
+    def _transposed(self, level):
+        '''True if a branch has already started from this level, with this much weight left and
+           at least as much value kept - nothing below can beat what that branch found.
+           Otherwise records this node in the transposition table.'''
+
+        if not self.table_size:
+            return False
+
+        key = (level, self.floor)
+        kept_value = self.table.get(key)
+        if kept_value is not None and kept_value >= self.kept_value:
+            self.table.move_to_end(key)
+            self.stats['table_hits'] += 1
+            return True
+
+        self.table[key] = self.kept_value
+        self.table.move_to_end(key)
+        self.stats['table_stores'] += 1
+
+        if len(self.table) > self.table_size:
+            self.table.popitem(last=False)
+            self.stats['table_evictions'] += 1
+
+        return False
+
+    def _branch_selection(self, item):
+        '''The items kept on the branch so far. current_set can still hold 1s from earlier
+           branches after the item being added, and at the level the branch left from (which
+           is excluded) - neither counts towards kept_value, so neither is in the selection.'''
+
+        selection = self.current_set.copy()
+        selection[item+1:] = 0
+        if self.current_level < self.next_level:
+            selection[self.current_level] = 0
+
+        return selection
+
     def next_branch(self, item):
         '''Updates state values for next branch to be traversed. Calculates:
            (1) max_potential_value
@@ -82,125 +339,81 @@ class dfs:
            (4) index_level and item set'''
         
         # update floor and max_potential_value
-        if item == len(self.items) - 1: # branch exhausted
-            if self.current_set[0] == 1:  
+        if item == self.item_count - 1: # branch exhausted
+            if self.current_set.all():
+                # every item fits, so there is nothing left to search
+                self.current_set[:] = 0
+                self.current_level = 0
+                self.kept_value = 0
+                self.floor = self.capacity
+
+            elif self.current_set[0] == 1:
             # find first 0, set level to one higher and that value to 0
                 self.current_level = np.where(self.current_set == 0)[0][0] - 1                
                 self.current_set[self.current_level] = 0
                 self.current_set[item] = 1
+
+                # every item before the level is kept
+                self.kept_value = int(self.cum_kept_value[self.current_level])
+                self.floor = self.capacity - int(self.cum_kept_weight[self.current_level])
                 
             else:
                 # find first 1, set value to 0 and make current level; subsequent levels to 1
                 self.current_level = np.where(self.current_set == 1)[0][0]                
                 self.current_set[self.current_level] = 0
                 self.current_set[self.current_level+1:] = 1
+
+                # no item before the level is kept
+                self.kept_value = 0
+                self.floor = self.capacity
         else:
+            # the items added on this branch are already counted - the level it left from
+            # joins them, if current_set still marks it
+            if (self.current_level < self.next_level) & (self.current_set[self.current_level] == 1):
+                self.kept_value += int(self.values[self.current_level])
+                self.floor -= int(self.weights[self.current_level])
+
             self.current_level = item
         
-        # calculate floor and kept value
-        self.floor, self.kept_value = self._update_floor_and_kept_value(items=self.items, 
-                                                                        capacity=self.capacity, 
-                                                                        level=self.current_level, 
-                                                                        function_set=self.current_set.copy(),
-                                                                        iterations=self.iterations)
         # calculate max value
-        self.current_max_value = self._value_estimate(items=self.items, 
-                                                        capacity=self.capacity, 
-                                                        level=self.current_level, 
-                                                        function_set=self.current_set.copy(), 
-                                                        iterations=self.iterations)
+        if self.floor >= 0:
+            self.current_max_value = self.kept_value + self._upper_bound(next_item=self.current_level + 1,
+                                                                         floor=self.floor)
+        else:
+            self.current_max_value = -np.inf
 
         self.next_level = self.current_level + 1
         
         return self.current_max_value, self.floor, self.kept_value, self.next_level, self.current_set
         
-    @staticmethod
-    def _value_estimate(items, capacity, level, function_set, iterations):
-        '''This finds the best fractional value that the bag can hold.'''
-        
-        # initialize. since this is an update, it is called when branches
-        # "move left" - therefore, the current level will be 0 (item not included)
-        estimated_value = 0
-        if iterations > 0:
-            function_set[level] = 0
-            function_set[level+1:] = 1
-        
-        # for new branch, calculate potential/fractional value creation
-        for i, item in enumerate(items):
-            if (item.weight < capacity) & (function_set[i] == 1):
-                estimated_value += item.value
-                capacity -= item.weight
-            elif function_set[i] == 0:
-                pass
-            else:
-                return(estimated_value + capacity*item.density)
-
-        return estimated_value
-    
-    @staticmethod
-    def _update_floor_and_kept_value(items, capacity, level, function_set, iterations):
-        '''This finds the floor and "starting value" for the node in the new branch.''' 
-        
-        # initialize. set later values to 0 - this allows us to loop through the 
-        # branch fully without accounting for those items' value
-        floor = capacity
-        kept_value = 0
-        if iterations > 0:
-            function_set[level] = 0
-            function_set[level+1:] = 0
-
-        for i, item in enumerate(items):
-            if (item.weight < capacity) & (function_set[i] == 1):
-                floor -= item.weight
-                kept_value += item.value
-            elif function_set[i] == 0:
-                pass
-
-        return floor, kept_value
-    
-    def _load_data(self):
-        '''Takes Coursera input files splits them, and creates a tuple in 
-        their preferred format. Sorted - needs to be unsorted for output.'''
-    
-        def density_sort(item_list):
-            return(sorted(item_list, key=lambda item:-item.density))
+    def _upper_bound(self, next_item, floor):
+        '''This finds the most value that the rest of the bag can hold, with the chosen bound.'''
 
-        Item = namedtuple("Item", ['index', 'value', 'weight', 'density'])
+        start_time = time.perf_counter()
+        estimated_value = self.bound(self.items, next_item, floor)
+        self.stats['bound_seconds'] += time.perf_counter() - start_time
+        self.stats['bound_evaluations'] += 1
 
-        # parse the input
-        lines = self.input_data.split('\n')
-
-        firstLine = lines[0].split()
-        item_count = int(firstLine[0])
-        capacity = int(firstLine[1])
-
-        items = []
-
-        for i in range(1, item_count+1):
-            line = lines[i]
-            parts = line.split()
-            items.append(Item(i-1, int(parts[0]), int(parts[1]), 
-                              float(parts[0])/float(parts[1])))
-
-        items = density_sort(items)
-
-        return items, item_count, capacity
+        return estimated_value
     
-    def _generate_output(self):
-        '''Since we sorted the output to improve the runtime, we need to resort
-           it back to the original value for grading.'''
+    def _generate_output(self, optimal=False):
+        '''Prepares the best solution in the specified output format - the second field is 1
+           when it is proven optimal.'''
         
-        # sort "back" the selected items
-        index_list = []
-        for i, item in enumerate(self.items):
-            index_list.append(self.items[i].index)
-            
-        zipped_list = zip(index_list, self.best_set)
-        resorted_selection = sorted(list(zipped_list), key=lambda x: x[0])
-        final_selection = [y for (x, y) in resorted_selection]
+        final_selection = self._original_order(self.best_set)
         
         # prepare the solution in the specified output format
-        output_data = str(self.best_value) + ' ' + str(0) + '\n '
+        output_data = str(self.fixed_value + self.best_value) + ' ' + str(int(optimal)) + '\n '
         output_data += ' '.join(map(str, final_selection))
         
-        return output_data
\ No newline at end of file
+        return output_data
+
+    def _original_order(self, selection):
+        '''Since we sorted the output to improve the runtime, we need to resort
+           it back to the original value for grading. The items fixed in are always taken.'''
+        
+        final_selection = self.items.original_order(selection, self.original_item_count)
+        for item in self.fixed_index.tolist():
+            final_selection[item] = 1
+
+        return final_selection
@@ -0,0 +1,136 @@
+'''Brad Allen. A limited discrepancy search, for good solutions early.'''
+
+import time
+import numpy as np
+from anytime import anytime
+from bounds import BOUNDS, DEFAULT_BOUND
+from depth_first import DFS_TIME_LIMIT
+from dynamic_prog import dp
+from instance import instance
+
+class lds:
+    '''Searches the same tree as dfs - the items in density order, each taken or left - but in
+       order of how far a path strays from the greedy one. Greedy takes every item that fits,
+       so a discrepancy is leaving out an item that fits. The search first follows the greedy
+       path (0 discrepancies), then every path with exactly 1, then 2, and so on - so the time
+       goes on paths near greedy, spread across the whole tree, instead of deep in one corner.
+
+       A path is a series of runs - the items that fit one after another, found with a
+       searchsorted on the prefix sums, as in dfs - and the item that ends each run does not
+       fit. A discrepancy leaves out one item of a run, and the search carries on after it.
+       Paths that cannot beat the best value (see bounds) are pruned.
+
+       Once an iteration finds no path with room for another discrepancy, every path has been
+       searched, and the best value is proven optimal.'''
+
+    def __init__(self, input_data, bound=DEFAULT_BOUND):
+        if bound not in BOUNDS:
+            raise ValueError('Unknown bound %r, expected one of: %s' % (bound, ', '.join(BOUNDS)))
+
+        self.input_data = input_data
+        self.items = instance.load(input_data).by_density()
+        self.item_count, self.capacity = self.items.item_count, self.items.capacity
+        self.cum_weight, self.cum_value = self.items.cum_weight, self.items.cum_value
+        self.bound = BOUNDS[bound]
+
+        self.best_value = 0
+        self.best_set = np.zeros(self.item_count, dtype=int)
+        self.stats = {'bound': bound, 'nodes': 0, 'bound_evaluations': 0, 'pruned': 0, 'discrepancies': 0,
+                      'curve': []}
+
+    def discrepancy_algo(self, control=None, time_limit=DFS_TIME_LIMIT):
+        '''Runs an iteration for each number of discrepancies until every path is searched or
+           the control (see anytime) expires. Without a deadline on the control, the search
+           stops after time_limit seconds. Every better solution is reported to the control as
+           it is found, and recorded with the seconds it took in stats['curve'].'''
+
+        control = control or anytime()
+        control.bound(self._upper_bound(0, self.capacity))
+        self.start_time = time.time()
+        deadline = control.deadline if control.deadline is not None else self.start_time + time_limit
+
+        complete, discrepancies = False, 0
+        while not control.expired() and time.time() < deadline:
+            self.stats['discrepancies'] = discrepancies
+            finished, more = self._iteration(discrepancies, control, deadline)
+            if not finished:
+                break
+            if not more:
+                complete = True
+                break
+            discrepancies += 1
+
+        control.finish(self.best_value, self.items.original_order(self.best_set), complete)
+        self.stats['prune_rate'] = self.stats['pruned'] / max(self.stats['bound_evaluations'], 1)
+        self.stats['optimal'] = control.optimal
+
+        return dp._format_output(control.best_value, control.best_set, control.optimal)
+
+    def _iteration(self, discrepancies, control, deadline):
+        '''Searches every path with exactly this many discrepancies. Returns whether it
+           finished before the control expired, and whether some path had room for another.'''
+
+        # each open node - where the path goes on from, the weight left, the value kept, the
+        # discrepancies still to make, and the items left out so far
+        stack = [(0, self.capacity, 0, discrepancies, ())]
+        more = False
+
+        while stack:
+            if control.expired() or time.time() >= deadline:
+                return False, more
+
+            item, floor, value, remaining, left_out = stack.pop()
+            self.stats['nodes'] += 1
+
+            while item < self.item_count:
+                if value + self._upper_bound(item, floor) <= self.best_value:
+                    self.stats['pruned'] += 1
+                    break
+
+                # the run of items that fit one after another
+                end = int(np.searchsorted(self.cum_weight, self.cum_weight[item] + floor, side='right')) - 1
+                end = max(end, item)
+
+                if remaining:
+                    # leave out one item of the run, and carry on after it
+                    for skipped in range(item, end):
+                        stack.append((skipped + 1, floor - int(self.cum_weight[skipped] - self.cum_weight[item]),
+                                      value + int(self.cum_value[skipped] - self.cum_value[item]),
+                                      remaining - 1, left_out + (skipped,)))
+                elif end > item:
+                    more = True
+
+                value += int(self.cum_value[end] - self.cum_value[item])
+                floor -= int(self.cum_weight[end] - self.cum_weight[item])
+
+                # the item that ends the run does not fit
+                item = end + 1
+
+            else:
+                if remaining == 0 and value > self.best_value:
+                    self._improve(value, left_out, control)
+
+        return True, more
+
+    def _improve(self, value, left_out, control):
+        '''Records the path that leaves out these items (and takes every other item that fits).'''
+
+        selection = np.zeros(self.item_count, dtype=int)
+        floor = self.capacity
+        left_out = set(left_out)
+
+        for item, weight in enumerate(self.items.weight.tolist()):
+            if item not in left_out and weight <= floor:
+                selection[item] = 1
+                floor -= weight
+
+        self.best_value, self.best_set = value, selection
+        self.stats['curve'].append((time.time() - self.start_time, value))
+        control.improve(value, self.items.original_order(selection))
+
+    def _upper_bound(self, next_item, floor):
+        '''The most value that the rest of the bag can hold, with the chosen bound.'''
+
+        self.stats['bound_evaluations'] += 1
+
+        return self.bound(self.items, next_item, floor)
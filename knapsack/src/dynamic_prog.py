@@ -2,84 +2,414 @@
 
 import pandas as pd
 import os
-from collections import namedtuple
 import numpy as np
+from anytime import anytime
+from bounds import dantzig_bound
+from instance import instance
+
+# the largest table (in bytes) the solver will allocate before switching modes
+DEFAULT_MEMORY_BUDGET = 2 * 1024**3
+
+# number of capacities updated at a time when a value row is updated in place
+ROW_BLOCK = 2**20
 
 class dp:
     
-    def __init__(self):
+    def __init__(self, input_data, memory_budget=DEFAULT_MEMORY_BUDGET):
         self.input_data = input_data
+        self.items = instance.load(input_data)
+        self.memory_budget = memory_budget
+        self.stats = {}
     
-    def dynamic_programming_algo(self):
+    def dynamic_programming_algo(self, control=None):
         '''Generates a table for dynamic programming and infers output.
-           Uses significant space and time O(k*n), but guaranteed optimal.'''
+           Uses significant space and time O(k*n), but guaranteed optimal.
+           
+           The table is indexed by capacity, or by value when the total value of the items
+           is smaller than the capacity (and that table fits in memory). If the capacity
+           table does not fit in the memory budget, only one row of values is kept and the
+           take/skip decisions are stored as bits instead. If those do not fit either, the
+           linear space algorithm is used. The choices made are recorded in self.stats.
+
+           If the control (see anytime) expires, the table stops after the items built so far,
+           and the best of that table and the greedy solution is returned.'''
         
         # load the data
-        items, item_count, capacity = self._load_data()
+        items, item_count, capacity = self.items, self.items.item_count, self.items.capacity
+        total_value = int(items.value.sum())
 
-        # build the table
-        dp_table = self._build_table(items, item_count, capacity)
+        # the greedy solution is the first incumbent, in case the table is stopped early, and
+        # the fractional bound is the first upper bound - if they meet, there is no table to build
+        control = control or anytime()
+        control.improve(*self._greedy_solution(items, capacity))
+        control.bound(self._lp_bound(items, capacity))
 
-        # generate output
-        output_data = self._generate_output(dp_table, items, item_count, capacity)
+        # the table costs O(k*n) indexed by capacity, or O(sum(values)*n) indexed by value
+        self.stats['capacity_cost'] = capacity * item_count
+        self.stats['value_cost'] = total_value * item_count
+        self.stats['axis'], self.stats['mode'], _ = self._choose_table(item_count, capacity, total_value,
+                                                                       self.memory_budget)
 
-        return output_data
+        if self.stats['axis'] == 'value':
+            value_table = self._build_value_table(items, item_count, total_value, control)
+            items_built = value_table.shape[1] - 1
+            optimal_value, items_taken = self._value_traceback(value_table, items, items_built, capacity)
 
-    def _load_data(self):
-        '''Takes Coursera input files splits them, and creates a tuple in 
-           their preferred format. Unsorted.'''
-        
-        Item = namedtuple("Item", ['index', 'value', 'weight', 'density'])
+        elif self.stats['mode'] == 'dense':
+            # build the table
+            dp_table = self._build_table(items, item_count, capacity, control)
+            items_built = dp_table.shape[1] - 1
+
+            # generate output
+            optimal_value, items_taken = self._traceback(dp_table, items, items_built, capacity)
+
+        elif self.stats['mode'] == 'packed':
+            value_row, decision_bits = self._build_packed_table(items, item_count, capacity, control)
+            items_built = len(decision_bits)
+            optimal_value = int(value_row[capacity])
+            items_taken = self._packed_traceback(decision_bits, items, items_built, capacity)
+
+        else:
+            return self.linear_space_algo(control)
+
+        items_taken += [0]*(item_count - items_built)
+
+        return self._finish(control, optimal_value, items_taken, items_built == item_count)
+
+    @classmethod
+    def _choose_table(cls, item_count, capacity, total_value, memory_budget):
+        '''Picks the table dynamic_programming_algo builds - the axis it is indexed by and 
+           how it is stored - and returns them with the memory it needs.'''
+
+        if total_value < capacity and cls._dense_table_bytes(item_count, total_value) <= memory_budget:
+            return 'value', 'dense', cls._dense_table_bytes(item_count, total_value)
+
+        if cls._dense_table_bytes(item_count, capacity) <= memory_budget:
+            return 'capacity', 'dense', cls._dense_table_bytes(item_count, capacity)
+
+        if cls._packed_table_bytes(item_count, capacity) <= memory_budget:
+            return 'capacity', 'packed', cls._packed_table_bytes(item_count, capacity)
+
+        return 'capacity', 'linear_space', cls._linear_space_bytes(capacity)
+
+    def linear_space_algo(self, control=None):
+        '''Hirschberg-style divide and conquer over the items. Only value rows of length
+           capacity+1 are held in memory, so the space is O(k) regardless of the number
+           of items - at the cost of roughly twice the work of the table. Guaranteed optimal,
+           unless the control expires - then the subproblems not yet solved are left empty.'''
+
+        # load the data
+        items, item_count, capacity = self.items, self.items.item_count, self.items.capacity
+
+        if self._linear_space_bytes(capacity) > self.memory_budget:
+            raise MemoryError('The value rows for capacity %d do not fit in %d bytes.'
+                              % (capacity, self.memory_budget))
+
+        control = control or anytime()
+        control.improve(*self._greedy_solution(items, capacity))
+        control.bound(self._lp_bound(items, capacity))
+
+        items_taken = [0]*item_count
+        self._divide_and_conquer(items, capacity, items_taken, 0, self.memory_budget, control)
+        optimal_value = int(items.value @ np.array(items_taken))
+
+        return self._finish(control, optimal_value, items_taken, not control.expired())
+
+    def pareto_frontier_algo(self, control=None):
+        '''Sparse dynamic programming (Nemhauser-Ullmann). Instead of a value for every
+           capacity, only the non-dominated (weight, value) states are kept after each item,
+           so the work depends on the number of such states rather than on the capacity.
+           Items are taken in density order, and states whose fractional bound (the bound of
+           dfs._value_estimate) cannot reach the best value seen are dropped. The largest bound
+           left is an upper bound for the control, and the search stops once the best state
+           meets it. Guaranteed optimal, unless the control expires - then the best state so far
+           is returned.'''
+
+        # load the data
+        items, item_count, capacity = self.items, self.items.item_count, self.items.capacity
+
+        # density sorted arrays, with prefix sums for the fractional bound
+        order = items.order
+        sorted_items = items.by_density()
+        weights, values, densities = sorted_items.weight, sorted_items.value, sorted_items.density
+        cum_weight, cum_value = sorted_items.cum_weight, sorted_items.cum_value
+
+        # the greedy solution is the starting incumbent
+        control = control or anytime()
+        best_value, greedy_taken = self._greedy_solution(items, capacity)
+        control.improve(best_value, greedy_taken)
+
+        # the frontier is sorted by weight, with strictly increasing values. trail[k] records
+        # where each state after item k came from, in the concatenation of "skip" and "take"
+        frontier_weight = np.zeros(1, dtype=np.int64)
+        frontier_value = np.zeros(1, dtype=np.int64)
+        trail = []
+        trail_bytes = 0
 
-        # parse the input
-        lines = self.input_data.split('\n')
+        for k in range(item_count):
+            if control.expired():
+                break
 
-        first_line = lines[0].split()
-        item_count = int(first_line[0])
-        capacity = int(first_line[1])
+            candidate_weight = np.concatenate((frontier_weight, frontier_weight + weights[k]))
+            candidate_value = np.concatenate((frontier_value, frontier_value + values[k]))
 
-        items = []
+            # drop states over capacity, or that cannot beat the incumbent
+            origin = np.flatnonzero(candidate_weight <= capacity)
+            bound = self._fractional_bound(candidate_weight[origin], candidate_value[origin], capacity,
+                                           k + 1, cum_weight, cum_value, densities)
+            origin = origin[bound > best_value - 0.5]
+            control.bound(max(best_value, bound.max(initial=0)))
 
-        for i in range(1, item_count+1):
-            line = lines[i]
-            parts = line.split()
-            items.append(Item(i-1, int(parts[0]), int(parts[1]), float(parts[0])/float(parts[1])))
+            # sort by weight (ties by value, highest first) and drop dominated states - 
+            # those not worth more than some lighter state
+            origin = origin[np.lexsort((-candidate_value[origin], candidate_weight[origin]))]
+            sorted_value = candidate_value[origin]
+            non_dominated = np.ones(len(origin), dtype=bool)
+            non_dominated[1:] = sorted_value[1:] > np.maximum.accumulate(sorted_value)[:-1]
+            origin = origin[non_dominated]
 
-        return items, item_count, capacity
+            trail.append((len(frontier_weight), origin))
+            trail_bytes += origin.nbytes
+            frontier_weight = candidate_weight[origin]
+            frontier_value = candidate_value[origin]
+            best_value = max(best_value, int(frontier_value[-1]))
+            if best_value >= control.upper_bound:
+                break
+
+            # the candidates, bounds and sort keys are a small multiple of the frontier
+            if trail_bytes + 8 * frontier_weight.nbytes > self.memory_budget:
+                raise MemoryError('The Pareto frontier grew past %d bytes at item %d of %d.'
+                                  % (self.memory_budget, k + 1, item_count))
+
+        # the most valuable state is the heaviest one. walk back through the trail
+        items_taken = [0]*item_count
+        state = len(frontier_value) - 1
+        optimal_value = int(frontier_value[state])
+
+        for k in range(len(trail) - 1, -1, -1):
+            skip_count, origin = trail[k]
+            state = int(origin[state])
+            if state >= skip_count:
+                items_taken[order[k]] = 1
+                state -= skip_count
+
+        return self._finish(control, optimal_value, items_taken, len(trail) == item_count)
 
     @staticmethod
-    def _build_table(items, item_count, capacity):
+    def _build_table(items, item_count, capacity, control=None):
         '''Create a table that is the capacity of the knapsack+1 and the number of items+1.
            For every item added, calculate the optimal solution at every capacity. This is
            done by iteratively building the table, and referring back to the prior optimal
-           solution (ie. from the last item's solution).'''
+           solution (ie. from the last item's solution). If the control expires, only the
+           columns built so far are returned.'''
         
-        # initialize the table
-        dp_table = np.zeros(shape=(capacity + 1, item_count + 1))
+        # initialize the table. column-major, so each item's column is contiguous
+        dp_table = np.zeros(shape=(capacity + 1, item_count + 1), order='F')
 
         for j in range(item_count):
-            item = items[j]
-            for i in range(capacity + 1):
-                current_weight = item.weight
-                current_value = item.value
+            if control is not None and control.expired():
+                return dp_table[:, :j+1]
 
-                value_if_include = 0
-                prior_knapsack_at_weight = dp_table[i, j]
-                
-                # determine what the weight would be if the new item is included
-                if current_weight <= i:
-                    prior_knapsack_if_included = dp_table[max(i-current_weight, 0), j]
-                    value_if_include = prior_knapsack_if_included + current_value
+            current_weight = int(items.weight[j])
+            current_value = int(items.value[j])
 
-                if value_if_include > prior_knapsack_at_weight:
-                    dp_table[i, j+1] = value_if_include
-                else:
-                    dp_table[i, j+1] = prior_knapsack_at_weight
+            # the whole column is updated at once - not including the item keeps the
+            # prior column, including it shifts the prior column down by its weight
+            dp_table[:, j+1] = dp_table[:, j]
+            if current_weight <= capacity:
+                dp_table[current_weight:, j+1] = np.maximum(dp_table[current_weight:, j],
+                                                            dp_table[:capacity + 1 - current_weight, j] + current_value)
 
         return dp_table
 
     @staticmethod
-    def _generate_output(dp_table, items, item_count, capacity):
+    def _build_value_table(items, item_count, total_value, control=None):
+        '''The same table turned on its side - indexed by value instead of capacity, holding
+           the minimum weight needed to reach exactly that value with the first items (inf
+           when the value cannot be reached). Cheaper when the values are small. Stops early
+           like _build_table.'''
+
+        # initialize the table. only a value of 0 is reachable with no items
+        value_table = np.full(shape=(total_value + 1, item_count + 1), fill_value=np.inf, order='F')
+        value_table[0, 0] = 0
+
+        for j in range(item_count):
+            if control is not None and control.expired():
+                return value_table[:, :j+1]
+
+            current_weight = int(items.weight[j])
+            current_value = int(items.value[j])
+
+            # including the item shifts the prior column up by its value, adding its weight
+            value_table[:, j+1] = value_table[:, j]
+            np.minimum(value_table[current_value:, j], value_table[:total_value + 1 - current_value, j] + current_weight,
+                       out=value_table[current_value:, j+1])
+
+        return value_table
+
+    @staticmethod
+    def _value_traceback(value_table, items, item_count, capacity):
+        '''The optimal value is the largest value whose minimum weight fits in the knapsack.
+           From there, the traceback is the same as _traceback - if the weight changed from
+           the last item's column, the current item was added.'''
+
+        # initialize
+        items_taken = [0]*item_count
+        optimal_value = int(np.flatnonzero(value_table[:, item_count] <= capacity)[-1])
+        current_value = optimal_value
+
+        for current_item in range(item_count, 0, -1):
+            if value_table[current_value, current_item] != value_table[current_value, current_item-1]:
+                items_taken[current_item-1] = 1
+                current_value = current_value - int(items.value[current_item-1])
+
+        return optimal_value, items_taken
+
+    @staticmethod
+    def _dense_table_bytes(item_count, capacity):
+        '''Size of the float table built by _build_table (or by _build_value_table, with
+           the total value in place of the capacity).'''
+
+        return (capacity + 1) * (item_count + 1) * 8
+
+    @staticmethod
+    def _packed_table_bytes(item_count, capacity):
+        '''Size of the decision bits, the value row, and the working buffers used by 
+           _build_packed_table.'''
+
+        return (item_count + 1) * ((capacity + 8) // 8) + (capacity + 1) * (8 + 1) + ROW_BLOCK * 8
+
+    @staticmethod
+    def _linear_space_bytes(capacity):
+        '''Size of the two value rows, plus one temporary block, used by _divide_and_conquer.'''
+
+        return (capacity + 1) * 8 * 2 + ROW_BLOCK * 8
+
+    @staticmethod
+    def _build_value_row(items, capacity, control=None):
+        '''The final column of _build_table for these items, as integers, without
+           keeping any of the earlier columns. The row is updated in place from the top
+           down, a block at a time, so a block is the only temporary allocated.'''
+
+        value_row = np.zeros(capacity + 1, dtype=np.int64)
+
+        for weight, value in zip(items.weight.tolist(), items.value.tolist()):
+            if control is not None and control.expired():
+                break
+
+            for high in range(capacity + 1, weight, -ROW_BLOCK):
+                low = max(high - ROW_BLOCK, weight)
+                np.maximum(value_row[low:high], value_row[low - weight:high - weight] + value,
+                           out=value_row[low:high])
+
+        return value_row
+
+    @classmethod
+    def _divide_and_conquer(cls, items, capacity, items_taken, offset, memory_budget, control=None):
+        '''Fills items_taken[offset:offset+len(items)] with an optimal selection of items
+           at this capacity. The items are split in half, and a value row is computed for 
+           each half (the second half backwards). The best split of the capacity between the
+           halves is where the sum of both rows peaks, and each half is then solved on its
+           own share of the capacity. Once a subproblem's decision bits fit in memory, it is
+           solved directly with the packed table. If the control expires, the subproblems
+           not yet solved are left empty - which is still a feasible selection.'''
+
+        item_count = len(items)
+
+        if control is not None and control.expired():
+            return
+
+        if item_count == 1:
+            if items.weight[0] <= capacity and items.value[0] > 0:
+                items_taken[offset] = 1
+            return
+
+        if cls._packed_table_bytes(item_count, capacity) <= memory_budget:
+            _, decision_bits = cls._build_packed_table(items, item_count, capacity, control)
+            items_taken[offset:offset + len(decision_bits)] = cls._packed_traceback(decision_bits, items, 
+                                                                                    len(decision_bits), capacity)
+            return
+
+        # find how much capacity the first half gets in an optimal solution
+        middle = item_count // 2
+        combined_value = cls._build_value_row(items[:middle], capacity, control)
+        combined_value += cls._build_value_row(items[middle:], capacity, control)[::-1]
+        split = int(np.argmax(combined_value))
+        del combined_value
+
+        cls._divide_and_conquer(items[:middle], split, items_taken, offset, memory_budget, control)
+        cls._divide_and_conquer(items[middle:], capacity - split, items_taken, offset + middle, 
+                                memory_budget, control)
+
+    @staticmethod
+    def _build_packed_table(items, item_count, capacity, control=None):
+        '''Same recurrence as _build_table, but only the latest column of values is kept.
+           For every item, a bit per capacity records whether including the item improved
+           the value - this is all the traceback needs, and is packed 8 to a byte. Stops
+           early like _build_table, returning the decision bits built so far.'''
+
+        value_row = np.zeros(capacity + 1, dtype=np.int64)
+        decision_bits = np.zeros(shape=(item_count, (capacity + 8) // 8), dtype=np.uint8)
+        item_included = np.zeros(capacity + 1, dtype=bool)
+
+        for j in range(item_count):
+            if control is not None and control.expired():
+                return value_row, decision_bits[:j]
+
+            current_weight = int(items.weight[j])
+            current_value = int(items.value[j])
+
+            # the row is updated in place from the top down, as in _build_value_row
+            item_included[:current_weight] = False
+            for high in range(capacity + 1, current_weight, -ROW_BLOCK):
+                low = max(high - ROW_BLOCK, current_weight)
+                value_if_include = value_row[low - current_weight:high - current_weight] + current_value
+                np.greater(value_if_include, value_row[low:high], out=item_included[low:high])
+                np.maximum(value_row[low:high], value_if_include, out=value_row[low:high])
+
+            decision_bits[j] = np.packbits(item_included)
+
+        return value_row, decision_bits
+
+    @staticmethod
+    def _fractional_bound(state_weight, state_value, capacity, next_item, cum_weight, cum_value, densities):
+        '''The best fractional value reachable from each state, filling the remaining capacity
+           with the density sorted items from next_item onwards. The prefix sums find the
+           break item for every state at once.'''
+
+        target = cum_weight[next_item] + (capacity - state_weight)
+        break_item = np.searchsorted(cum_weight, target, side='right') - 1
+        bound = (state_value + cum_value[break_item] - cum_value[next_item]).astype(float)
+
+        partial = break_item < len(densities)
+        bound[partial] += (target - cum_weight[break_item])[partial] * densities[break_item[partial]]
+
+        return bound
+
+    @staticmethod
+    def _packed_traceback(decision_bits, items, item_count, capacity):
+        '''Walks back through the decision bits - a set bit at the current capacity means
+           the item was included, so its weight comes out of the remaining capacity.'''
+
+        items_taken = [0]*item_count
+        current_capacity = capacity
+
+        for current_item in range(item_count - 1, -1, -1):
+            byte = decision_bits[current_item, current_capacity >> 3]
+            if (byte >> (7 - (current_capacity & 7))) & 1:
+                items_taken[current_item] = 1
+                current_capacity = current_capacity - int(items.weight[current_item])
+
+        return items_taken
+
+    @classmethod
+    def _generate_output(cls, dp_table, items, item_count, capacity):
+        '''Formats the result of _traceback.'''
+
+        return cls._format_output(*cls._traceback(dp_table, items, item_count, capacity), optimal=True)
+
+    @staticmethod
+    def _traceback(dp_table, items, item_count, capacity):
         '''With the table output, determine the items that compose the optimal solution.
            This can be determined by reverse engineering the table (eg, if the "maximum value"
            was the same for a given capacity for the last item, the current item was not added.'''
@@ -97,7 +427,7 @@ class dp:
                 items_taken[current_item-1] = 1
                 
                 # reset for next iteration
-                current_capacity = current_capacity - items[current_item-1].weight
+                current_capacity = current_capacity - int(items.weight[current_item-1])
                 current_item = prior_item
                 prior_item = current_item - 1
 
@@ -106,8 +436,47 @@ class dp:
                 current_item = prior_item
                 prior_item = current_item - 1
 
-        # prepare the solution in the specified output format
-        output_data = str(optimal_value) + ' ' + str(0) + '\n'
+        return optimal_value, items_taken
+
+    @staticmethod
+    def _greedy_solution(items, capacity):
+        '''Takes the items in density order, as long as they fit.'''
+
+        optimal_value = 0
+        items_taken = [0]*len(items)
+        floor = capacity
+        weights, values = items.weight.tolist(), items.value.tolist()
+
+        for i in items.order.tolist():
+            if weights[i] <= floor:
+                floor -= weights[i]
+                optimal_value += values[i]
+                items_taken[i] = 1
+
+        return optimal_value, items_taken
+
+    def _finish(self, control, optimal_value, items_taken, optimal):
+        '''Reports the result to the control. An engine stopped early may not have beaten
+           the incumbent it started from, so the output is the control's best solution.'''
+
+        control.finish(optimal_value, items_taken, optimal)
+        self.stats['optimal'] = control.optimal
+
+        return self._format_output(control.best_value, control.best_set, control.optimal)
+
+    @staticmethod
+    def _lp_bound(items, capacity):
+        '''The fractional (LP) bound of the instance - the items in density order as long as
+           they fit, plus the fraction of the first one that does not.'''
+
+        return dantzig_bound(items.by_density(), 0, capacity)
+
+    @staticmethod
+    def _format_output(optimal_value, items_taken, optimal=False):
+        '''Prepares the solution in the specified output format - the second field is 1 when
+           the value is proven optimal.'''
+
+        output_data = str(optimal_value) + ' ' + str(int(optimal)) + '\n'
         output_data += ' '.join(map(str, items_taken))
 
         return output_data
\ No newline at end of file
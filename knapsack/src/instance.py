@@ -0,0 +1,205 @@
+'''Brad Allen. The items of a knapsack instance, shared by every engine.'''
+
+import hashlib
+import mmap
+import numpy as np
+
+# bytes of a file parsed at a time - only this much of the text is copied out of the mapping
+PARSE_CHUNK_BYTES = 1 << 26
+
+# the arrays an instance is made of (see from_arrays)
+ARRAYS = ['index', 'value', 'weight', 'density', 'order', 'cum_weight', 'cum_value']
+
+class instance:
+    '''An instance held as contiguous arrays instead of a list of Item tuples - items.weight[i]
+       rather than items[i].weight:
+           index   - each item's position in the instance it was taken from,
+           value, weight (int64) and density (value per unit of weight, float64),
+           order   - the positions in density order (highest first, ties in input order),
+           cum_weight, cum_value - prefix sums of the items in this order, so a run of items
+                     i..j-1 weighs cum_weight[j] - cum_weight[i].
+
+       Slicing (items[:k]) or take() gives the instance of those items, and by_density() gives
+       the items in density order, which the search engines work in. Either way, index still
+       points back to the original items.
+
+       The loaders take a cache (see instance_cache), which keeps the arrays of every instance
+       parsed so that later loads of the same input skip the parse and the sort.'''
+
+    def __init__(self, value, weight, capacity, index=None):
+        self.value = np.ascontiguousarray(value, dtype=np.int64)
+        self.weight = np.ascontiguousarray(weight, dtype=np.int64)
+        self.capacity = int(capacity)
+        self.item_count = len(self.value)
+
+        if index is None:
+            self.index = np.arange(self.item_count, dtype=np.int64)
+        else:
+            self.index = np.ascontiguousarray(index, dtype=np.int64)
+
+        self.density = self.value / self.weight
+        self.order = np.argsort(-self.density, kind='stable')
+        self.cum_weight = np.concatenate(([0], np.cumsum(self.weight)))
+        self.cum_value = np.concatenate(([0], np.cumsum(self.value)))
+
+    @classmethod
+    def from_arrays(cls, capacity, **arrays):
+        '''The instance made of these arrays (one for each name in ARRAYS), as they are - they
+           are not copied or checked, and the density order and prefix sums are not recomputed.'''
+
+        items = cls.__new__(cls)
+        items.capacity = int(capacity)
+        for name in ARRAYS:
+            setattr(items, name, arrays[name])
+        items.item_count = len(items.value)
+
+        return items
+
+    @classmethod
+    def load(cls, input_data, cache=None):
+        '''The instance for an input file's contents (or the instance itself, if it already
+           is one) - so the engines take either.'''
+
+        if isinstance(input_data, cls):
+            return input_data
+        if cache is not None:
+            return cache.load(input_data)
+
+        # parse the input in one pass - the first line is the item count and capacity, then a
+        # value and weight per line
+        numbers = _parse(input_data)
+        item_count, capacity = int(numbers[0]), int(numbers[1])
+
+        return cls._from_numbers(numbers[2:2 + 2*item_count], item_count, capacity)
+
+    @classmethod
+    def from_file(cls, file_location, cache=None):
+        '''The instance in an input file. The file is memory mapped and parsed a chunk of whole
+           lines at a time into one array, so its text is never held in memory all at once.'''
+
+        if cache is not None:
+            return cache.from_file(file_location)
+
+        with open(file_location, 'rb') as input_data_file, \
+                mmap.mmap(input_data_file.fileno(), 0, access=mmap.ACCESS_READ) as input_data:
+            header_end = input_data.find(b'\n')
+            header_end = len(input_data) if header_end < 0 else header_end
+            item_count, capacity = map(int, input_data[:header_end].split()[:2])
+
+            numbers = np.empty(2 * item_count, dtype=np.int64)
+            parsed, position = 0, header_end + 1
+
+            while parsed < len(numbers) and position < len(input_data):
+                end = len(input_data)
+                if position + PARSE_CHUNK_BYTES < end:
+                    end = input_data.rfind(b'\n', position, position + PARSE_CHUNK_BYTES) + 1 or end
+
+                chunk = _parse(input_data[position:end])[:len(numbers) - parsed]
+                numbers[parsed:parsed + len(chunk)] = chunk
+                parsed, position = parsed + len(chunk), end
+
+        return cls._from_numbers(numbers[:parsed], item_count, capacity)
+
+    @classmethod
+    def from_stream(cls, stream, consumers=(), chunk_bytes=PARSE_CHUNK_BYTES):
+        '''The instance read from a binary stream (a file opened 'rb', or sys.stdin.buffer) a
+           chunk of whole lines at a time. The values and weights go straight into arrays sized
+           from the first line, so only they and one chunk of text are held in memory.
+
+           Each consumer sees the items as they arrive - consumer.begin(item_count, capacity)
+           after the first line, then consumer.add(first_item, values, weights) for each chunk -
+           so work that needs no more than the items so far starts before the input ends.'''
+
+        item_count, capacity = map(int, stream.readline().split()[:2])
+        value, weight = np.empty(item_count, dtype=np.int64), np.empty(item_count, dtype=np.int64)
+        for consumer in consumers:
+            consumer.begin(item_count, capacity)
+
+        parsed, rest = 0, b''
+        while parsed < item_count:
+            chunk = stream.read(chunk_bytes)
+
+            # a partial last line waits for the next chunk
+            input_data = rest + chunk
+            cut = input_data.rfind(b'\n') + 1 if chunk else len(input_data)
+            input_data, rest = input_data[:cut], input_data[cut:]
+
+            numbers = _parse(input_data)[:2 * (item_count - parsed)]
+            count = len(numbers) // 2
+            value[parsed:parsed + count], weight[parsed:parsed + count] = numbers[0:2*count:2], numbers[1:2*count:2]
+            for consumer in consumers:
+                consumer.add(parsed, value[parsed:parsed + count], weight[parsed:parsed + count])
+            parsed += count
+
+            if not chunk:
+                break
+
+        if parsed != item_count:
+            raise ValueError('Expected %d items, found %d.' % (item_count, parsed))
+
+        return cls(value, weight, capacity)
+
+    @classmethod
+    def _from_numbers(cls, numbers, item_count, capacity):
+        '''The instance for the values and weights, one after another.'''
+
+        if len(numbers) != 2 * item_count:
+            raise ValueError('Expected %d items, found %d numbers after the first line.' % (item_count, len(numbers)))
+
+        parts = numbers.reshape(item_count, 2)
+
+        return cls(parts[:, 0], parts[:, 1], capacity)
+
+    def __len__(self):
+        return self.item_count
+
+    def __getitem__(self, positions):
+        return self.take(positions)
+
+    def take(self, positions):
+        '''The instance of the items at these positions (a slice, indices or a mask), in that
+           order, with the same capacity.'''
+
+        return instance(self.value[positions], self.weight[positions], self.capacity, self.index[positions])
+
+    def by_density(self):
+        '''The items in density order.'''
+
+        return self.take(self.order)
+
+    def to_input(self):
+        '''The instance in the input file format.'''
+
+        output_data = str(self.item_count) + ' ' + str(self.capacity) + '\n'
+        output_data += ''.join(str(value) + ' ' + str(weight) + '\n'
+                               for value, weight in zip(self.value.tolist(), self.weight.tolist()))
+
+        return output_data
+
+    def fingerprint(self):
+        '''A hash of the capacity, values and weights - the same for the same items, in the
+           same order.'''
+
+        digest = hashlib.sha1(str(self.capacity).encode())
+        digest.update(np.ascontiguousarray(self.value).tobytes())
+        digest.update(np.ascontiguousarray(self.weight).tobytes())
+
+        return digest.hexdigest()
+
+    def original_order(self, items_taken, item_count=None):
+        '''Maps a selection of these items back to the positions in index - as a list of 0s
+           and 1s over item_count items (by default, as many as there are here).'''
+
+        final_selection = np.zeros(self.item_count if item_count is None else item_count, dtype=int)
+        final_selection[self.index[np.asarray(items_taken, dtype=bool)]] = 1
+
+        return final_selection.tolist()
+
+
+def _parse(input_data):
+    '''The integers in the text, in one pass - numpy reads text of only whitespace as a 0.'''
+
+    if input_data.isspace() or not input_data:
+        return np.zeros(0, dtype=np.int64)
+
+    return np.fromstring(input_data, dtype=np.int64, sep=' ')
@@ -0,0 +1,129 @@
+'''Brad Allen. A binary cache of parsed instances, under the loaders.'''
+
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import numpy as np
+from instance import instance, ARRAYS
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'knapsack', 'instances')
+
+# the most the cache may hold on disk, in bytes - past it, the least recently used go first
+DEFAULT_CACHE_BYTES = 1 << 30
+
+# bumped whenever the stored form changes, so older entries are rebuilt instead of misread
+FORMAT_VERSION = 1
+
+class instance_cache:
+    '''Keeps every instance it parses on disk, keyed by a hash of the input text, so loading the
+       same input again skips the parse and the density sort. An entry is a directory holding
+       each of the instance's arrays (see instance.ARRAYS) as a raw .npy file, and its capacity
+       and item count - loaded with np.load(mmap_mode='r'), so the arrays are read from the
+       page cache rather than copied.
+
+       Entries are checked before they are used - one from another format version, or with a
+       missing or mis-sized array (say, from a write that was cut off), is removed and the
+       input parsed again. Entries are written to a temporary directory and renamed into place.
+       A hit touches its entry, and after every store the least recently used entries are
+       removed until the cache is within max_bytes.
+
+       Hits, misses, invalid entries and evictions are counted in self.stats.'''
+
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'invalid': 0, 'evictions': 0}
+
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, input_data):
+        '''The instance for an input file's contents (see instance.load).'''
+
+        key = hashlib.sha1(input_data.encode()).hexdigest()
+        items = self._cached(key)
+
+        return items if items is not None else self._store(key, instance.load(input_data))
+
+    def from_file(self, file_location):
+        '''The instance in an input file (see instance.from_file). The key is the hash of the
+           file's contents, so it matches load() on the same text.'''
+
+        with open(file_location, 'rb') as input_data_file, \
+                mmap.mmap(input_data_file.fileno(), 0, access=mmap.ACCESS_READ) as input_data:
+            key = hashlib.sha1(input_data).hexdigest()
+        items = self._cached(key)
+
+        return items if items is not None else self._store(key, instance.from_file(file_location))
+
+    def _cached(self, key):
+        '''The instance stored under the key, or None (a miss) if there is no valid entry.'''
+
+        entry = os.path.join(self.directory, key)
+        if not os.path.isdir(entry):
+            self.stats['misses'] += 1
+            return None
+
+        try:
+            with open(os.path.join(entry, 'meta.json'), 'r') as meta_file:
+                meta = json.load(meta_file)
+            if meta['version'] != FORMAT_VERSION:
+                raise ValueError('format version %r' % meta['version'])
+
+            arrays = {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r') for name in ARRAYS}
+            item_count = meta['item_count']
+            for name in ARRAYS:
+                expected = item_count + 1 if name.startswith('cum_') else item_count
+                if arrays[name].shape != (expected,):
+                    raise ValueError('%s has shape %s' % (name, arrays[name].shape))
+        except (OSError, KeyError, ValueError):
+            shutil.rmtree(entry, ignore_errors=True)
+            self.stats['invalid'] += 1
+            self.stats['misses'] += 1
+            return None
+
+        os.utime(entry)
+        self.stats['hits'] += 1
+
+        return instance.from_arrays(meta['capacity'], **arrays)
+
+    def _store(self, key, items):
+        '''Writes the instance under the key, evicts down to the size limit, and returns it.'''
+
+        staging = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+        for name in ARRAYS:
+            np.save(os.path.join(staging, name + '.npy'), getattr(items, name))
+        with open(os.path.join(staging, 'meta.json'), 'w') as meta_file:
+            json.dump({'version': FORMAT_VERSION, 'capacity': items.capacity, 'item_count': items.item_count},
+                      meta_file)
+
+        try:
+            os.rename(staging, os.path.join(self.directory, key))
+        except OSError:
+            # another process stored the same instance first
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self._evict()
+
+        return items
+
+    def _evict(self):
+        '''Removes the least recently used entries until the cache is within max_bytes.'''
+
+        entries = []
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, file_name)) for file_name in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            self.stats['evictions'] += 1
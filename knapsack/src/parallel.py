@@ -0,0 +1,212 @@
+'''Brad Allen. The depth first search, split across processes.'''
+
+import math
+import multiprocessing
+import os
+import time
+import numpy as np
+from anytime import anytime
+from bounds import BOUNDS, DEFAULT_BOUND
+from depth_first import dfs, DFS_TIME_LIMIT
+from dynamic_prog import dp
+from instance import instance
+from warm_start import warm_start
+
+# subproblems queued per worker, so a worker that finishes early has more to take
+TASKS_PER_WORKER = 8
+
+# branches a worker explores between reading the shared best value
+SYNC_ITERATIONS = 1000
+
+# how often (seconds) the main process checks the control while it waits on the workers
+POLL_SECONDS = 0.05
+
+# each worker's copy of the search - set by _init_worker when the pool starts
+_worker = {}
+
+class parallel_dfs:
+    '''Splits the depth first search on the first split_items items in density order - every
+       feasible way of taking or leaving them is a subproblem, searched by dfs on the items
+       after them with the weight they leave. The subproblems are queued for a pool of workers
+       most promising (highest bound) first, and an idle worker takes the next one, so the
+       work evens out however unbalanced the subtrees are.
+
+       The best value found by any worker is kept in shared memory. Every worker reads it
+       every SYNC_ITERATIONS branches and prunes against it, and skips a queued subproblem
+       whose bound cannot beat it - so an incumbent found by one worker prunes for all of them.
+
+       The search starts from the warm start solution (see warm_start). Like dfs, it is not
+       proven optimal when it ends - only the root bound is reported to the control.'''
+
+    def __init__(self, input_data, workers=None, bound=DEFAULT_BOUND):
+        if bound not in BOUNDS:
+            raise ValueError('Unknown bound %r, expected one of: %s' % (bound, ', '.join(BOUNDS)))
+
+        self.input_data = input_data
+        self.items = instance.load(input_data).by_density()
+        self.item_count, self.capacity = self.items.item_count, self.items.capacity
+        self.workers = workers or os.cpu_count() or 1
+        self.bound = bound
+
+        # enough subproblems to keep every worker busy, leaving at least one item to search
+        self.split_items = min(self.item_count - 1, math.ceil(math.log2(self.workers * TASKS_PER_WORKER)))
+        self.stats = {'bound': bound, 'workers': self.workers, 'split_items': self.split_items}
+
+    def parallel_algo(self, control=None, time_limit=DFS_TIME_LIMIT):
+        '''Searches the subproblems in the pool until they are done or the control (see anytime)
+           expires. Without a deadline on the control, the search stops after time_limit
+           seconds, as dfs does. Every better solution is reported to the control as the
+           subproblem that found it returns.'''
+
+        control = control or anytime()
+        control.bound(BOUNDS[self.bound](self.items, 0, self.capacity))
+        deadline = control.deadline if control.deadline is not None else time.time() + time_limit
+
+        tasks = self._subproblems()
+        self.stats.update(subproblems=len(tasks), skipped=0, iterations=0, bound_evaluations=0, pruned=0)
+
+        # the warm start (see warm_start) is the first best value every worker prunes against
+        best_value_found, start_set, warm_start_stats = warm_start(self.items)
+        self.stats.update(warm_start_stats)
+        best_set = self.items.original_order(start_set)
+        control.improve(best_value_found, best_set)
+
+        best_value = multiprocessing.Value('q', best_value_found)
+        stop = multiprocessing.Event()
+
+        with multiprocessing.Pool(self.workers, initializer=_init_worker,
+                                  initargs=(self.items, self.bound, best_value, stop, deadline)) as pool:
+            results = pool.imap_unordered(_search_subproblem, tasks)
+            remaining = len(tasks)
+
+            while remaining:
+                try:
+                    result = results.next(timeout=POLL_SECONDS)
+                except multiprocessing.TimeoutError:
+                    if control.expired():
+                        stop.set()
+                    continue
+
+                remaining -= 1
+                value, selection, stats = result
+                for key in ('skipped', 'iterations', 'bound_evaluations', 'pruned'):
+                    self.stats[key] += stats[key]
+
+                if selection is not None and value > best_value_found:
+                    best_value_found, best_set = value, self.items.original_order(selection)
+                    control.improve(value, best_set)
+
+        self.stats['prune_rate'] = self.stats['pruned'] / max(self.stats['bound_evaluations'], 1)
+        control.finish(best_value_found, best_set, False)
+        self.stats['optimal'] = control.optimal
+
+        return dp._format_output(control.best_value, control.best_set, control.optimal)
+
+    def _subproblems(self):
+        '''Every way of taking or leaving the first split_items items that fits, as
+           (taken, weight, value, bound) - highest bound first.'''
+
+        bound = BOUNDS[self.bound]
+        prefixes = [((), 0, 0)]
+
+        for item in range(self.split_items):
+            weight, value = int(self.items.weight[item]), int(self.items.value[item])
+            prefixes = [(taken + (take,), prefix_weight + take * weight, prefix_value + take * value)
+                        for taken, prefix_weight, prefix_value in prefixes for take in (1, 0)
+                        if prefix_weight + take * weight <= self.capacity]
+
+        tasks = [(taken, prefix_weight, prefix_value,
+                  prefix_value + bound(self.items, self.split_items, self.capacity - prefix_weight))
+                 for taken, prefix_weight, prefix_value in prefixes]
+
+        return sorted(tasks, key=lambda task: -task[3])
+
+
+def _init_worker(items, bound, best_value, stop, deadline):
+    '''Keeps the instance and the shared state in the worker process.'''
+
+    _worker.update(items=items, bound=bound, best_value=best_value, stop=stop, deadline=deadline)
+
+
+def _stopped():
+    '''True once the main process has stopped the search, or the deadline has passed.'''
+
+    return _worker['stop'].is_set() or time.time() >= _worker['deadline']
+
+
+def _search_subproblem(task):
+    '''Runs dfs on the items after the split, with the weight the taken ones leave. The
+       search prunes against the shared best value, less the value already taken - so it only
+       records solutions that beat every worker's. Returns the best of those (the value and
+       the selection of every item, in density order - or no selection if none was found),
+       and the search's stats.'''
+
+    taken, taken_weight, taken_value, task_bound = task
+    items, best_value = _worker['items'], _worker['best_value']
+    stats = {'skipped': 0, 'iterations': 0, 'bound_evaluations': 0, 'pruned': 0}
+
+    if task_bound < best_value.value or _stopped():
+        stats['skipped'] = 1
+        return 0, None, stats
+
+    # the items after the split that still fit - the rest can never be taken
+    split, floor = len(taken), items.capacity - taken_weight
+    rest = np.flatnonzero(items.weight[split:] <= floor) + split
+    found_value, found_set = 0, None
+
+    # the items taken are a solution on their own
+    if taken_value > best_value.value:
+        found_value, found_set = taken_value, np.zeros(len(rest), dtype=int)
+        _publish(found_value)
+
+    if len(rest) == 0:
+        return _result(found_value, found_set, taken, rest, items.item_count, stats)
+
+    engine = dfs(instance(items.value[rest], items.weight[rest], floor), bound=_worker['bound'], fix=False,
+                 warm_start_seconds=None)
+
+    # the search only needs to beat the shared best value
+    engine.best_value = known = max(best_value.value - taken_value, 0)
+
+    engine.explore_branch()
+    while True:
+        if engine.best_value > known:
+            known = engine.best_value
+            found_value, found_set = taken_value + known, engine.best_set.copy()
+            _publish(found_value)
+
+        if not engine.current_set.any() or _stopped():
+            break
+
+        if engine.iterations % SYNC_ITERATIONS == 0 and best_value.value - taken_value > known:
+            engine.best_value = known = best_value.value - taken_value
+
+        engine.explore_branch()
+
+    stats.update(iterations=engine.iterations, bound_evaluations=engine.stats['bound_evaluations'],
+                 pruned=engine.stats['pruned'])
+
+    return _result(found_value, found_set, taken, rest, items.item_count, stats)
+
+
+def _result(found_value, found_set, taken, rest, item_count, stats):
+    '''The value and the selection of every item, in density order, for a subproblem - the
+       split items taken, and the ones found among the rest.'''
+
+    if found_set is None:
+        return 0, None, stats
+
+    selection = np.zeros(item_count, dtype=int)
+    selection[:len(taken)] = taken
+    selection[rest] = found_set
+
+    return found_value, selection, stats
+
+
+def _publish(value):
+    '''Raises the shared best value, if this one is better.'''
+
+    best_value = _worker['best_value']
+    with best_value.get_lock():
+        if value > best_value.value:
+            best_value.value = value
@@ -0,0 +1,229 @@
+'''Brad Allen. Picks a solver for an instance before running anything.
+
+Every engine registers two functions - one that estimates the memory (bytes) and runtime
+(seconds) it needs from the size of the instance, and one that runs it. The planner runs
+the engine with the fastest estimate that fits in the memory budget.'''
+
+import logging
+import os
+from collections import namedtuple
+from anytime import anytime
+from best_first import best_first, DEFAULT_MAX_NODES, NODE_BYTES
+from bounds import DEFAULT_BOUND
+from core import core, DEFAULT_CORE_SIZE
+from depth_first import dfs, DFS_TIME_LIMIT
+from discrepancy import lds
+from dynamic_prog import dp, DEFAULT_MEMORY_BUDGET
+from parallel import parallel_dfs
+
+logger = logging.getLogger(__name__)
+
+# rough throughput of the vectorized DP tables, in cells per second
+DP_CELLS_PER_SECOND = 10**8
+
+# rough throughput of the depth first search, in branches per second
+DFS_BRANCHES_PER_SECOND = 10**5
+
+# rough throughput of the best first search, in nodes expanded per second
+BEST_FIRST_NODES_PER_SECOND = 10**5
+
+Engine = namedtuple("Engine", ['estimate', 'run'])
+Estimate = namedtuple("Estimate", ['engine', 'memory', 'seconds', 'note'])
+
+ENGINES = {}
+
+
+def register_engine(name, estimate, run):
+    '''Adds an engine to the planner.
+           estimate(item_count, capacity, total_value, memory_budget) -> (memory, seconds, note)
+           run(input_data, memory_budget, control, options) -> (output_data, stats)
+
+       options are the solve's settings (e.g. the bound for the searches) - each engine uses
+       the ones that apply to it.'''
+
+    ENGINES[name] = Engine(estimate, run)
+
+
+def plan(item_count, capacity, total_value, memory_budget=DEFAULT_MEMORY_BUDGET, engines=None):
+    '''Estimates every registered engine (or only the named engines) - the ones that fit in
+       the memory budget first, fastest first.'''
+
+    estimates = [Estimate(name, *engine.estimate(item_count, capacity, total_value, memory_budget))
+                 for name, engine in ENGINES.items() if engines is None or name in engines]
+
+    return sorted(estimates, key=lambda estimate: (estimate.memory > memory_budget, estimate.seconds))
+
+
+def run_plan(input_data, item_count, capacity, total_value, memory_budget=DEFAULT_MEMORY_BUDGET, engine=None,
+             control=None, options=None, engines=None):
+    '''Runs the planned engine and returns its output. If the engine runs out of memory
+       after all, the next engine in the plan is tried. Passing an engine name skips the
+       planning and runs that engine, and passing engines plans among only those. The
+       control (see anytime) and options are passed on to the engine.'''
+
+    control = control or anytime()
+    options = options or {}
+
+    if engine is not None:
+        if engine not in ENGINES:
+            raise ValueError('Unknown engine %r, expected one of: %s' % (engine, ', '.join(ENGINES)))
+
+        logger.info('planner: running %s (forced)', engine)
+        control.engine = engine
+        output_data, stats = ENGINES[engine].run(input_data, memory_budget, control, options)
+        logger.info('%s stats: %s', engine, stats)
+        return output_data
+
+    estimates = plan(item_count, capacity, total_value, memory_budget, engines)
+    for estimate in estimates:
+        logger.info('planner: %s needs ~%d bytes and ~%.3g s (%s)', *estimate)
+
+    for estimate in estimates:
+        if estimate.memory > memory_budget:
+            logger.info('planner: skipping %s - it needs more than the %d byte budget',
+                        estimate.engine, memory_budget)
+            continue
+
+        logger.info('planner: running %s - the fastest estimate that fits in memory', estimate.engine)
+        control.engine = estimate.engine
+        try:
+            output_data, stats = ENGINES[estimate.engine].run(input_data, memory_budget, control, options)
+        except MemoryError as error:
+            logger.info('planner: %s ran out of memory (%s), trying the next engine', estimate.engine, error)
+            continue
+
+        logger.info('%s stats: %s', estimate.engine, stats)
+        return output_data
+
+    raise MemoryError('No engine fits %d items at capacity %d in %d bytes.' % (item_count, capacity, memory_budget))
+
+
+def _estimate_dp(item_count, capacity, total_value, memory_budget):
+    '''The table dp would pick, and how many cells it fills (twice over in linear space).'''
+
+    axis, mode, table_bytes = dp._choose_table(item_count, capacity, total_value, memory_budget)
+    cells = item_count * ((total_value if axis == 'value' else capacity) + 1)
+    if mode == 'linear_space':
+        cells *= 2
+
+    return table_bytes, cells / DP_CELLS_PER_SECOND, '%s table, %s' % (axis, mode)
+
+
+def _run_dp(input_data, memory_budget, control, options):
+    check_output = dp(input_data=input_data, memory_budget=memory_budget)
+    output_data = check_output.dynamic_programming_algo(control)
+
+    return output_data, check_output.stats
+
+
+def _estimate_core(item_count, capacity, total_value, memory_budget):
+    '''A core around the break item is usually solved twice - once to get an incumbent,
+       and once more after the unproven items join it.'''
+
+    core_items = min(item_count, 2 * DEFAULT_CORE_SIZE + 1)
+    core_bytes = dp._packed_table_bytes(core_items, capacity)
+    if core_bytes > memory_budget:
+        core_bytes = dp._linear_space_bytes(capacity)
+
+    return core_bytes, 2 * core_items * (capacity + 1) / DP_CELLS_PER_SECOND, 'core of ~%d items' % core_items
+
+
+def _run_core(input_data, memory_budget, control, options):
+    check_output = core(input_data=input_data, memory_budget=memory_budget)
+    output_data = check_output.expanding_core_algo(control)
+
+    return output_data, check_output.stats
+
+
+def _estimate_pareto(item_count, capacity, total_value, memory_budget):
+    '''The frontier can hold a state for every capacity (or every subset, if fewer) - the
+       worst case, since the pruning cannot be known in advance.'''
+
+    states = min(capacity + 1, 2**min(item_count, 62))
+    state_bytes = states * 8 * (8 + item_count)
+
+    return state_bytes, item_count * states / DP_CELLS_PER_SECOND, 'up to %d states' % states
+
+
+def _run_pareto(input_data, memory_budget, control, options):
+    check_output = dp(input_data=input_data, memory_budget=memory_budget)
+    output_data = check_output.pareto_frontier_algo(control)
+
+    return output_data, check_output.stats
+
+
+def _estimate_dfs(item_count, capacity, total_value, memory_budget):
+    '''Linear memory, but up to every branch of the tree - cut off by the time limit.'''
+
+    seconds = min(2**min(item_count, 62) / DFS_BRANCHES_PER_SECOND, DFS_TIME_LIMIT)
+
+    return item_count * 8 * 8, seconds, 'up to %d s' % DFS_TIME_LIMIT
+
+
+def _run_dfs(input_data, memory_budget, control, options):
+    # with a checkpoint file, the search carries on from the state saved in it
+    checkpoint = options.get('checkpoint')
+    if checkpoint is not None and os.path.exists(checkpoint):
+        testobj = dfs.resume(input_data, checkpoint, bound=options.get('bound', DEFAULT_BOUND))
+    else:
+        testobj = dfs(input_data=input_data, bound=options.get('bound', DEFAULT_BOUND))
+    output_data = testobj.depth_first_algo(control, checkpoint=checkpoint)
+
+    return output_data, testobj.stats
+
+
+def _estimate_best_first(item_count, capacity, total_value, memory_budget):
+    '''Up to every node of the tree, though the heap is capped - past the cap it dives depth
+       first instead.'''
+
+    nodes = 2**min(item_count, 62)
+
+    return min(nodes, DEFAULT_MAX_NODES) * NODE_BYTES, nodes / BEST_FIRST_NODES_PER_SECOND, \
+        'up to %d open nodes' % min(nodes, DEFAULT_MAX_NODES)
+
+
+def _run_best_first(input_data, memory_budget, control, options):
+    check_output = best_first(input_data=input_data, bound=options.get('bound', DEFAULT_BOUND))
+    output_data = check_output.best_first_algo(control)
+
+    return output_data, check_output.stats
+
+
+def _estimate_parallel_dfs(item_count, capacity, total_value, memory_budget):
+    '''The depth first search shared between a worker per core - each with its own copy of
+       the items.'''
+
+    workers = os.cpu_count() or 1
+    memory, seconds, note = _estimate_dfs(item_count, capacity, total_value, memory_budget)
+
+    return memory * workers, seconds / workers, '%d workers, %s' % (workers, note)
+
+
+def _run_parallel_dfs(input_data, memory_budget, control, options):
+    check_output = parallel_dfs(input_data=input_data, workers=options.get('workers'),
+                                bound=options.get('bound', DEFAULT_BOUND))
+    output_data = check_output.parallel_algo(control)
+
+    return output_data, check_output.stats
+
+
+def _estimate_lds(item_count, capacity, total_value, memory_budget):
+    '''The same tree as the depth first search, searched in another order.'''
+
+    return _estimate_dfs(item_count, capacity, total_value, memory_budget)
+
+
+def _run_lds(input_data, memory_budget, control, options):
+    check_output = lds(input_data=input_data, bound=options.get('bound', DEFAULT_BOUND))
+    output_data = check_output.discrepancy_algo(control)
+
+    return output_data, check_output.stats
+
+
+register_engine('dp', _estimate_dp, _run_dp)
+register_engine('core', _estimate_core, _run_core)
+register_engine('pareto', _estimate_pareto, _run_pareto)
+register_engine('dfs', _estimate_dfs, _run_dfs)
+register_engine('best_first', _estimate_best_first, _run_best_first)
+register_engine('parallel_dfs', _estimate_parallel_dfs, _run_parallel_dfs)
+register_engine('lds', _estimate_lds, _run_lds)
@@ -0,0 +1,167 @@
+'''Brad Allen. Instance reduction, run before any of the solvers.'''
+
+import numpy as np
+from anytime import BOUND_TOLERANCE
+from instance import instance
+
+
+def reduce_input(input_data):
+    '''Shrinks an instance (its input file contents, or an instance) before it is handed to a
+       solver:
+           (1) items heavier than the knapsack are dropped,
+           (2) weights and capacity are divided by the GCD of the weights,
+           (3) dominated items are dropped (see _dominated_items), and
+           (4) the capacity is clamped to the total weight of the items left.
+
+       Returns the reduced instance, the original index of each item kept (for expand_output),
+       and statistics on the reduction.'''
+
+    items = instance.load(input_data)
+    capacity = items.capacity
+    stats = {'items_before': items.item_count, 'capacity_before': capacity}
+
+    # (1) items that can never fit
+    kept = np.flatnonzero(items.weight <= capacity)
+    stats['too_heavy'] = items.item_count - len(kept)
+    weights, values = items.weight[kept], items.value[kept]
+
+    # (2) every total weight is a multiple of the GCD, so the capacity rounds down to one
+    divisor = int(np.gcd.reduce(weights)) if len(weights) else 0
+    if divisor > 1:
+        weights = weights // divisor
+        capacity = capacity // divisor
+    stats['gcd'] = max(divisor, 1)
+
+    # (3) items that some optimal solution can always do without
+    dominated = _dominated_items(weights, values, capacity)
+    undominated = ~np.isin(np.arange(len(kept)), list(dominated))
+    kept, weights, values = kept[undominated], weights[undominated], values[undominated]
+    stats['dominated'] = len(dominated)
+
+    # (4) a knapsack bigger than all the items is no different to one that just fits them
+    capacity = min(capacity, int(weights.sum()))
+
+    stats['items_after'] = len(kept)
+    stats['items_removed'] = items.item_count - len(kept)
+    stats['total_value'] = int(values.sum())
+    stats['capacity_after'] = capacity
+    stats['capacity_shrink'] = stats['capacity_before'] / max(capacity, 1)
+
+    return instance(values, weights, capacity), kept.tolist(), stats
+
+
+def expand_output(output_data, original_index, item_count):
+    '''Maps a solver's output on the reduced instance back to the original items - the
+       removed items are never taken.'''
+
+    lines = output_data.split('\n')
+    items_taken = [0]*item_count
+
+    for reduced_index, taken in enumerate(lines[1].split()):
+        if int(taken):
+            items_taken[original_index[reduced_index]] = 1
+
+    return lines[0] + '\n' + ' '.join(map(str, items_taken))
+
+
+def _dominated_items(weights, values, capacity):
+    '''An item is dominated by another item that is no heavier and worth no less (ties
+       broken by position). Dropping a dominated item is only safe when it cannot fit
+       alongside all of the items dominating it - then any solution that takes it has a
+       dominating item left over to swap it for, which costs no weight or value.
+
+       Sorted by weight (lightest first, then most valuable first), the items dominating
+       an item are the ones before it worth at least as much. Their total weight is kept
+       in a Fenwick tree indexed by value rank.'''
+
+    order = np.lexsort((np.arange(len(weights)), -values, weights)).tolist()
+    distinct_values = np.unique(values)
+    value_rank = (len(distinct_values) - np.searchsorted(distinct_values, values)).tolist()
+    weights = weights.tolist()
+    tree = [0]*(len(distinct_values) + 1)
+
+    dominated = set()
+    for i in order:
+        rank = value_rank[i]
+
+        # total weight of the earlier items worth at least as much
+        dominating_weight = 0
+        position = rank
+        while position > 0:
+            dominating_weight += tree[position]
+            position -= position & -position
+
+        if dominating_weight + weights[i] > capacity:
+            dominated.add(i)
+
+        position = rank
+        while position < len(tree):
+            tree[position] += weights[i]
+            position += position & -position
+
+    return dominated
+
+
+
+def greedy_solution(items):
+    '''The density greedy solution - every item, in density order, that still fits. items
+       must be in density order (see instance.by_density). Returns its value and selection.'''
+
+    selection = np.zeros(items.item_count, dtype=int)
+    floor, value = items.capacity, 0
+
+    for item, weight in enumerate(items.weight.tolist()):
+        if weight <= floor:
+            selection[item] = 1
+            floor -= weight
+            value += int(items.value[item])
+
+    return value, selection
+
+
+def fix_items(items, incumbent_value):
+    '''Reduced cost fixing. For each item, the fractional (LP) bound is found with the item
+       forced out and with it forced in. If no solution without the item can reach the
+       incumbent value, the item is fixed in - and if none with it can, it is fixed out. A
+       solution worth the incumbent value takes every item fixed in and none fixed out, so
+       it stays a solution once they are fixed. Items too heavy to fit alongside the ones
+       fixed in are fixed out too. items must be in density order.
+
+       Returns masks of the items fixed in and fixed out.'''
+
+    weights = items.weight
+    positions = np.arange(items.item_count)
+
+    bound_out = _bound_without(items, positions, np.full(items.item_count, items.capacity))
+    bound_in = np.where(weights <= items.capacity,
+                        items.value + _bound_without(items, positions, items.capacity - weights), -np.inf)
+
+    # the bounds are sums of floats, so they get the same slack as when they are rounded down
+    fixed_in = bound_out * (1 + BOUND_TOLERANCE) < incumbent_value
+    fixed_out = ~fixed_in & (bound_in * (1 + BOUND_TOLERANCE) < incumbent_value)
+
+    # and the items too heavy to join the ones fixed in
+    fixed_out |= ~fixed_in & (weights > items.capacity - int(weights[fixed_in].sum()))
+
+    return fixed_in, fixed_out
+
+
+def _bound_without(items, positions, floors):
+    '''The fractional bound of every item except the one at each position, for the weight
+       left - from the prefix sums, so all of them are found at once. Without an item after
+       the break item the bound is unchanged. Otherwise the items after it move up by its
+       weight, so the break item is where its weight more than the floor runs out.'''
+
+    cum_weight, cum_value = items.cum_weight, items.cum_value
+    density = np.append(items.density, 0)
+    floors = np.maximum(floors, 0)
+
+    break_item = np.searchsorted(cum_weight, floors, side='right') - 1
+    full_bound = cum_value[break_item] + (floors - cum_weight[break_item]) * density[break_item]
+
+    shifted = floors + np.where(positions <= break_item, items.weight[positions], 0)
+    shifted_break = np.searchsorted(cum_weight, shifted, side='right') - 1
+    shifted_bound = (cum_value[shifted_break] - items.value[positions] +
+                     (shifted - cum_weight[shifted_break]) * density[shifted_break])
+
+    return np.where(positions <= break_item, shifted_bound, full_bound)
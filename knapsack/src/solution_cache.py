@@ -0,0 +1,117 @@
+'''Brad Allen. A persistent cache of solve_it results.'''
+
+import json
+import os
+import tempfile
+from collections import namedtuple
+import numpy as np
+
+DEFAULT_SOLUTION_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'knapsack', 'solutions')
+
+# the most solutions the cache keeps - past it, the least recently used go first
+DEFAULT_MAX_SOLUTIONS = 10000
+
+Solution = namedtuple("Solution", ['value', 'optimal', 'taken', 'engine', 'seconds'])
+
+class solution_cache:
+    '''Keeps the best solution found for every instance, keyed by its fingerprint (see
+       instance.fingerprint) - the value, whether it is proven optimal, the items taken, the
+       engine that found it and how long the solve took. An entry is a JSON file, written to a
+       temporary file and renamed into place.
+
+       A solution is checked against the instance before it is served - an entry whose items
+       do not fit, or are not worth its value, is removed. A later solve replaces an entry only
+       with a better value, or the same value newly proven optimal. A hit touches its entry,
+       and after every store the least recently used entries are removed until the cache holds
+       at most max_solutions.
+
+       Hits, misses, invalid entries, upgrades and evictions are counted in self.stats.'''
+
+    def __init__(self, directory=DEFAULT_SOLUTION_DIRECTORY, max_solutions=DEFAULT_MAX_SOLUTIONS):
+        self.directory = directory
+        self.max_solutions = max_solutions
+        self.stats = {'hits': 0, 'misses': 0, 'invalid': 0, 'upgrades': 0, 'evictions': 0}
+
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, items):
+        '''The solution stored for the instance, or None if there is no valid one.'''
+
+        solution = self._read(items)
+        if solution is None:
+            self.stats['misses'] += 1
+            return None
+
+        os.utime(self._entry(items))
+        self.stats['hits'] += 1
+
+        return solution
+
+    def put(self, items, solution):
+        '''Stores the solution, unless the one already stored is as good - the same value or
+           better, and proven optimal if this one is. Returns the solution stored.'''
+
+        stored = self._read(items)
+        if stored is not None and (stored.value > solution.value or
+                                   (stored.value == solution.value and (stored.optimal or not solution.optimal))):
+            return stored
+        if stored is not None:
+            self.stats['upgrades'] += 1
+
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, prefix='.tmp-', suffix='.json',
+                                         delete=False) as entry_file:
+            json.dump({'value': solution.value, 'optimal': solution.optimal,
+                       'taken': ''.join(map(str, solution.taken)), 'engine': solution.engine,
+                       'seconds': solution.seconds}, entry_file)
+        os.replace(entry_file.name, self._entry(items))
+
+        self._evict()
+
+        return solution
+
+    def _read(self, items):
+        '''The solution stored for the instance, or None - removing it if it is not valid.'''
+
+        entry = self._entry(items)
+
+        try:
+            with open(entry, 'r') as entry_file:
+                stored = json.load(entry_file)
+            solution = Solution(stored['value'], stored['optimal'], [int(taken) for taken in stored['taken']],
+                                stored['engine'], stored['seconds'])
+        except OSError:
+            return None
+        except (KeyError, TypeError, ValueError):
+            solution = None
+
+        if solution is None or not _feasible(items, solution):
+            os.remove(entry)
+            self.stats['invalid'] += 1
+            return None
+
+        return solution
+
+    def _entry(self, items):
+        '''The file of the instance's entry.'''
+
+        return os.path.join(self.directory, items.fingerprint() + '.json')
+
+    def _evict(self):
+        '''Removes the least recently used entries until at most max_solutions are left.'''
+
+        entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                   if name.endswith('.json') and not name.startswith('.')]
+
+        for entry in sorted(entries, key=os.path.getmtime)[:max(len(entries) - self.max_solutions, 0)]:
+            os.remove(entry)
+            self.stats['evictions'] += 1
+
+
+def _feasible(items, solution):
+    '''True if the items taken fit in the knapsack and are worth the solution's value.'''
+
+    taken = np.asarray(solution.taken, dtype=np.int64)
+    if len(taken) != items.item_count or not np.isin(taken, [0, 1]).all():
+        return False
+
+    return (int(taken @ items.weight) <= items.capacity and int(taken @ items.value) == solution.value)
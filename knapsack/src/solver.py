@@ -1,43 +1,118 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import numpy as np
+import logging
 import time
-from depth_first import dfs
-from dynamic_prog import dp
+from anytime import anytime
+from dynamic_prog import dp, DEFAULT_MEMORY_BUDGET
+from instance import instance
+from planner import run_plan
+from reduction import reduce_input, expand_output
+from solution_cache import Solution
+from warm_start import online_greedy
 
-def solve_it(input_data):
+logger = logging.getLogger(__name__)
+
+def solve_it(input_data, engine=None, control=None, bound=None, checkpoint=None, cache=None, solutions=None,
+             memory_budget=DEFAULT_MEMORY_BUDGET, engines=None):
     # Modify this code to run your optimization algorithm
 
-    try:
-        check_output = dp(file_location=input_data)
-        output_data = check_output.dynamic_programming_algo()
-        return output_data
+    # the control (see anytime) carries the deadline, incumbent callback and cancellation, and
+    # holds the best solution and whether it is proven optimal when this returns
+    control = control or anytime()
+
+    # the upper bound the branch and bound searches prune with (see bounds)
+    options = {} if bound is None else {'bound': bound}
+
+    # the depth first search saves its state to the checkpoint file, and resumes from it
+    if checkpoint is not None:
+        options['checkpoint'] = checkpoint
+
+    # with a cache (see instance_cache), an input seen before is not parsed again
+    items = instance.load(input_data, cache=cache)
+    start_time = time.time()
+
+    # with a solution cache (see solution_cache), a solution proven optimal before is served as is
+    cached = solutions.get(items) if solutions is not None else None
+    if cached is not None and cached.optimal:
+        logger.info('solution cache: serving the optimal solution %s found by %s', cached.value, cached.engine)
+        control.engine = cached.engine
+        control.finish(cached.value, cached.taken, True)
+        return dp._format_output(cached.value, cached.taken, optimal=True)
+
+    # shrink the instance first - the solvers only see the reduced items
+    reduced_items, original_index, reduction_stats = reduce_input(items)
+    logger.info('reduction stats: %s', reduction_stats)
+
+    if not original_index:
+        output_data = dp._format_output(0, [], optimal=True)
+        control.finish(0, [0]*reduction_stats['items_before'], True)
+    else:
+        # the planner picks the engine (among engines, if given) from the size of the reduced
+        # instance and the memory budget, unless one is forced
+        reduced_control = control.for_reduced(original_index, reduction_stats['items_before'])
+        output_data = run_plan(reduced_items, reduction_stats['items_after'], reduction_stats['capacity_after'],
+                               reduction_stats['total_value'], memory_budget=memory_budget, engine=engine,
+                               control=reduced_control, options=options, engines=engines)
+        control.engine = reduced_control.engine
+    logger.info('best value %s, upper bound %s, gap %s, optimal %s', control.best_value, control.upper_bound,
+                control.gap(), control.optimal)
+
+    output_data = expand_output(output_data, original_index, reduction_stats['items_before'])
+
+    # keep the solution if it beats the cached one - or serve the cached one, if it is better
+    if solutions is not None:
+        lines = output_data.split('\n')
+        value, optimal = map(int, lines[0].split())
+        solution = Solution(value, bool(optimal), [int(taken) for taken in lines[1].split()], control.engine,
+                            time.time() - start_time)
+        stored = solutions.put(items, solution)
+        if stored is not solution:
+            logger.info('solution cache: the cached solution %s beats %s', stored.value, value)
+            control.improve(stored.value, stored.taken)
+            output_data = dp._format_output(stored.value, stored.taken, stored.optimal)
+
+    return output_data
+
+
+def solve_stream(stream, engine=None, control=None, bound=None, checkpoint=None, solutions=None):
+    '''solve_it on an instance read from a binary stream (see instance.from_stream) - for
+       inputs too large to hold as text. A first fit solution is built while the items arrive
+       (see online_greedy), and reported to the control as soon as the input ends, before the
+       reduction and the engine run.'''
+
+    control = control or anytime()
+
+    greedy = online_greedy()
+    items = instance.from_stream(stream, consumers=[greedy])
+    logger.info('online greedy: %s (first fit %s, best item %s)', greedy.solution()[0],
+                greedy.first_fit_value, greedy.best_item_value)
+    control.improve(*greedy.solution())
 
-    except:
-        testobj = dfs(input_data=input_data)
-        testobj.explore_branch()
+    output_data = solve_it(items, engine=engine, control=control, bound=bound, checkpoint=checkpoint,
+                           solutions=solutions)
 
-        first_time = time.time()
-        second_time = time.time()
-        
-        # exhaust
-        while np.sum(testobj.current_set) > 0 & (second_time - first_time < 300):
-            testobj.explore_branch()
-            second_time = time.time()
-        
-        output_data = testobj._generate_output()
+    # an engine stopped early may not have caught up with the online solution
+    if control.best_value > int(output_data.split()[0]):
+        output_data = dp._format_output(control.best_value, control.best_set, control.optimal)
 
-        return output_data
+    return output_data
 
 
 if __name__ == '__main__':
     import sys
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format='%(message)s')
     if len(sys.argv) > 1:
         file_location = sys.argv[1].strip()
-        with open(file_location, 'r') as input_data_file:
-            input_data = input_data_file.read()
-        print(solve_it(input_data))
+        engine = sys.argv[2].strip() if len(sys.argv) > 2 else None
+        bound = sys.argv[3].strip() if len(sys.argv) > 3 else None
+        checkpoint = sys.argv[4].strip() if len(sys.argv) > 4 else None
+        if file_location == '-':
+            # stream the instance from stdin (python solver.py - < ./data/ks_4_0)
+            print(solve_stream(sys.stdin.buffer, engine=engine, bound=bound, checkpoint=checkpoint))
+        else:
+            input_data = instance.from_file(file_location)
+            print(solve_it(input_data, engine=engine, bound=bound, checkpoint=checkpoint))
     else:
         print('This test requires an input file.  Please select one from the data directory. (i.e. python solver.py ./data/ks_4_0)')
 
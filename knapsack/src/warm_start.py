@@ -0,0 +1,162 @@
+'''Brad Allen. Starting solutions for the branch and bound searches.'''
+
+import itertools
+import time
+import numpy as np
+from reduction import greedy_solution
+
+# how long (seconds) the local search may run
+WARM_START_SECONDS = 1.0
+
+# the taken items at the end, and the items left at the start, of the density order that the
+# swaps try - the items either side of the break item, where the greedy solution can go wrong
+ONE_SWAP_WINDOW = 500
+TWO_SWAP_WINDOW = 40
+
+
+def warm_start(items, time_limit=WARM_START_SECONDS):
+    '''A strong starting solution, built in stages - each starting from the best so far:
+           (1) the density greedy solution,
+           (2) the most valuable item that fits, then the greedy solution of what is left, and
+           (3) a local search - exchanging one taken item for one left out (1-swap), then up to
+               two for up to two (2-swap), until no exchange gains value or time_limit
+               seconds have passed.
+       items must be in density order (see instance.by_density).
+
+       Returns the value and selection, and the value after each stage in stats.'''
+
+    deadline = time.time() + time_limit
+    stats = {}
+
+    value, selection = greedy_solution(items)
+    stats['greedy_value'] = value
+
+    fits = np.flatnonzero(items.weight <= items.capacity)
+    if len(fits):
+        best_item = fits[np.argmax(items.value[fits])]
+        single_value, single_selection = _fill(items, best_item)
+        if single_value > value:
+            value, selection = single_value, single_selection
+    stats['single_item_value'] = value
+
+    moves = 0
+    for size, window in [(1, ONE_SWAP_WINDOW), (2, TWO_SWAP_WINDOW)]:
+        while time.time() < deadline:
+            gain, selection = _best_swap(items, selection, size, window)
+            if gain <= 0:
+                break
+            value += gain
+            moves += 1
+
+    stats.update(local_search_value=value, local_search_moves=moves)
+
+    return value, selection, stats
+
+
+def _fill(items, first_item):
+    '''The given item, and then every item in density order that still fits.'''
+
+    selection = np.zeros(items.item_count, dtype=int)
+    selection[first_item] = 1
+
+    return _greedy_fill(items, selection)
+
+
+def _greedy_fill(items, selection):
+    '''Adds every item left out, in density order, that still fits. Returns the value and
+       selection.'''
+
+    floor = items.capacity - int(items.weight[selection == 1].sum())
+
+    for item in np.flatnonzero(selection == 0).tolist():
+        if items.weight[item] <= floor:
+            selection[item] = 1
+            floor -= int(items.weight[item])
+
+    return int(items.value[selection == 1].sum()), selection
+
+
+def _best_swap(items, selection, size, window):
+    '''The best exchange of up to size taken items for up to size items left out, among the
+       last window taken and the first window left out - every group of each is compared at
+       once. Applies it (and fills any room it leaves) if it gains value. Returns the gain and
+       the selection.'''
+
+    taken = np.flatnonzero(selection == 1)[-window:]
+    left_out = np.flatnonzero(selection == 0)[:window]
+    floor = items.capacity - int(items.weight[selection == 1].sum())
+
+    taken_groups, taken_weight, taken_value = _groups(items, taken, size)
+    left_out_groups, left_out_weight, left_out_value = _groups(items, left_out, size)
+
+    gain = left_out_value[None, :] - taken_value[:, None]
+    gain[left_out_weight[None, :] - taken_weight[:, None] > floor] = 0
+
+    best = np.unravel_index(np.argmax(gain), gain.shape)
+    if gain[best] <= 0:
+        return 0, selection
+
+    before = int(items.value[selection == 1].sum())
+    selection = selection.copy()
+    selection[list(taken_groups[best[0]])] = 0
+    selection[list(left_out_groups[best[1]])] = 1
+    value, selection = _greedy_fill(items, selection)
+
+    return value - before, selection
+
+
+def _groups(items, positions, size):
+    '''Every group of up to size of the items at these positions (including none), with the
+       weight and value of each.'''
+
+    groups = [group for count in range(size + 1) for group in itertools.combinations(positions.tolist(), count)]
+    weight = np.array([int(items.weight[list(group)].sum()) for group in groups], dtype=np.int64)
+    value = np.array([int(items.value[list(group)].sum()) for group in groups], dtype=np.int64)
+
+    return groups, weight, value
+
+
+class online_greedy:
+    '''Builds a starting solution while the items are still arriving (see instance.from_stream)
+       - the better of first fit (every item, in the order they arrive, that still fits) and the
+       most valuable item that fits. Neither needs the density order, so both are done when the
+       last item arrives.'''
+
+    def begin(self, item_count, capacity):
+        self.capacity = capacity
+        self.floor = capacity
+        self.first_fit = np.zeros(item_count, dtype=np.int8)
+        self.first_fit_value = 0
+        self.best_item, self.best_item_value = None, 0
+
+    def add(self, first_item, values, weights):
+        '''Takes every item of the chunk that still fits, in order. The items up to the first
+           one that does not fit are found with a cumulative sum, and then the same is done on
+           the items after it that are light enough - so each pass takes at least one item.'''
+
+        positions = np.flatnonzero(weights <= self.floor)
+        while len(positions):
+            cum_weight = np.cumsum(weights[positions])
+            count = int(np.searchsorted(cum_weight, self.floor, side='right'))
+
+            self.first_fit[first_item + positions[:count]] = 1
+            self.first_fit_value += int(values[positions[:count]].sum())
+            self.floor -= int(cum_weight[count - 1])
+
+            positions = positions[count:][weights[positions[count:]] <= self.floor]
+
+        fits = np.flatnonzero(weights <= self.capacity)
+        if len(fits):
+            item = fits[np.argmax(values[fits])]
+            if values[item] > self.best_item_value:
+                self.best_item, self.best_item_value = first_item + int(item), int(values[item])
+
+    def solution(self):
+        '''The better starting solution - its value and selection, in the order the items arrived.'''
+
+        if self.best_item_value > self.first_fit_value:
+            selection = np.zeros(len(self.first_fit), dtype=int)
+            selection[self.best_item] = 1
+            return self.best_item_value, selection
+
+        return self.first_fit_value, self.first_fit.astype(int)